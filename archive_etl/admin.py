@@ -1,11 +1,12 @@
 from django.contrib import admin
 from .models import ScrapeSource, Article
+from .search import search_articles
 
 @admin.register(ScrapeSource)
 class ScrapeSourceAdmin(admin.ModelAdmin):
-    list_display = ("name", "base_url", "is_active", "language_code")
+    list_display = ("name", "base_url", "domain", "is_active", "language_code")
     list_filter = ("is_active", "language_code")
-    search_fields = ("name", "base_url")
+    search_fields = ("name", "base_url", "domain")
     ordering = ("name",)
 
 
@@ -13,10 +14,18 @@ class ScrapeSourceAdmin(admin.ModelAdmin):
 class ArticleAdmin(admin.ModelAdmin):
     list_display = ("title", "source", "pub_date", "scraped_at")
     list_filter = ("source", "source__language_code", "pub_date")
-    search_fields = ("title", "clean_text", "source_url", "author_name")
+    # clean_text is matched through the full-text index in get_search_results
+    search_fields = ("title", "url", "author_name")
     date_hierarchy = "pub_date"
     readonly_fields = ('scraped_at',)
 
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            fts_ids = [art.pk for art in search_articles(search_term, limit=500)]
+            results = results | queryset.filter(pk__in=fts_ids)
+        return results, may_have_duplicates
+
     def language_code(self, obj):
         return obj.source.language_code
     language_code.short_description = "Lang"
@@ -1,51 +1,37 @@
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
-
-# Use the new google.genai client
-try:
-    from google import genai as _genai
-except Exception:
-    _genai = None
+from webscraper import llm
 
 logger = logging.getLogger(__name__)
 
-def _init_client():
-    """Initialize Google GenAI client."""
-    if _genai is None:
-        return None
-    api_key = getattr(settings, 'CHATBOT_API_KEY', None)
-    if not api_key:
-        return None
-    try:
-        return _genai.Client(api_key=api_key)
-    except Exception as e:
-        logger.error(f"Failed to initialize GenAI client: {e}")
-        return None
+ANALYSIS_MODEL = "gemini-2.5-flash"
 
-def perform_thematic_analysis(topic, articles):
+def _estimate_tokens(text):
+    return llm.estimate_tokens(text)
+
+def _generate(prompt):
     """
-    Sends article summaries to Gemini to extract common themes and narratives.
+    Runs one generation and returns (text, call_report) with latency and
+    token usage (from usage_metadata when the API reports it, else estimated).
+    Re-running the same topic over the same articles is served from the
+    response cache.
     """
-    if not articles:
-        return "No articles found to analyze."
+    return llm.generate(
+        prompt,
+        model=ANALYSIS_MODEL,
+        config={
+            'temperature': 0.3, # Lower temperature for analytical consistency
+        },
+        api_key=getattr(settings, 'CHATBOT_API_KEY', None),
+        purpose="thematic_analysis",
+        cache=True,
+    )
 
-    # 1. Initialize the new SDK Client
-    client = _init_client()
-    if not client:
-        return "AI Client initialization failed. Check your API key."
+# --- Prompts ---
 
-    # 2. Prepare digest
-    content_digest = "\n\n".join([
-        f"Title: {a.title}\nExcerpt: {a.clean_text[:300]}..." 
-        for a in articles[:30] 
-    ])
-
-    prompt = f"""
-    You are an expert academic researcher specializing in Media Analysis.
-    I have collected news articles related to the topic: "{topic}".
-    Here is a digest of the content:
-    {content_digest}
-    
+ANALYSIS_SECTIONS = """
     Please perform a Thematic Analysis on this data. Provide the output in Markdown:
     1. **Key Themes**: Identify the top 3 recurring themes.
     2. **Narrative Tone**: Is the coverage generally positive, negative, or neutral?
@@ -53,20 +39,153 @@ def perform_thematic_analysis(topic, articles):
     4. **Research Summary**: A 2-sentence abstract of these findings.
     """
 
+def _analysis_prompt(topic, content_digest):
+    return f"""
+    You are an expert academic researcher specializing in Media Analysis.
+    I have collected news articles related to the topic: "{topic}".
+    Here is a digest of the content:
+    {content_digest}
+    {ANALYSIS_SECTIONS}"""
+
+def _map_prompt(topic, batch_digest, batch_no, batch_total):
+    return f"""
+    You are an expert academic researcher specializing in Media Analysis.
+    This is part {batch_no} of {batch_total} of a news corpus on the topic: "{topic}".
+    {batch_digest}
+
+    Write concise research notes for this part only, as bullet points under these headings:
+    Themes, Tone (positive/negative/neutral with a short justification), Entities, Notable Facts.
+    Do not write an introduction or conclusion.
+    """
+
+def _reduce_prompt(topic, notes, article_count):
+    joined = "\n\n".join(f"--- Notes for part {i} ---\n{n}" for i, n in enumerate(notes, start=1))
+    return f"""
+    You are an expert academic researcher specializing in Media Analysis.
+    The research notes below were written from {article_count} news articles on the topic: "{topic}",
+    analyzed in {len(notes)} parts. Merge them into one analysis of the whole corpus.
+    {joined}
+    {ANALYSIS_SECTIONS}"""
+
+# --- Batching ---
+
+def _article_block(article, max_chars):
+    return f"Title: {article.title}\nText: {article.clean_text[:max_chars]}"
+
+def chunk_articles(articles, token_budget, max_chars):
+    """
+    Groups article blocks into batches whose estimated size stays within
+    token_budget. An article longer than the budget gets a batch of its own.
+    """
+    batches, current, used = [], [], 0
+    for article in articles:
+        block = _article_block(article, max_chars)
+        cost = _estimate_tokens(block)
+        if current and used + cost > token_budget:
+            batches.append(current)
+            current, used = [], 0
+        current.append(block)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+# --- Analysis Modes ---
+
+def _single_pass(topic, articles, report):
+    """Original behaviour: one prompt over short excerpts of the first 30 articles."""
+    content_digest = "\n\n".join([
+        f"Title: {a.title}\nExcerpt: {a.clean_text[:300]}..."
+        for a in articles[:30]
+    ])
+    text, call = _generate(_analysis_prompt(topic, content_digest))
+    report["calls"].append({"phase": "single", **call})
+    return text
+
+def _map_reduce(topic, articles, report):
+    token_budget = getattr(settings, 'RESEARCH_AI_BATCH_TOKENS', 12000)
+    max_chars = getattr(settings, 'RESEARCH_AI_ARTICLE_CHARS', 8000)
+    concurrency = max(1, getattr(settings, 'RESEARCH_AI_CONCURRENCY', 4))
+
+    batches = chunk_articles(articles, token_budget, max_chars)
+    report.update({"batches": len(batches), "concurrency": concurrency})
+
+    # Small corpora fit one prompt: skip the reduce round-trip
+    if len(batches) == 1:
+        text, call = _generate(_analysis_prompt(topic, "\n\n".join(batches[0])))
+        report["calls"].append({"phase": "single", **call})
+        return text
+
+    def _map(indexed_batch):
+        batch_no, blocks = indexed_batch
+        prompt = _map_prompt(topic, "\n\n".join(blocks), batch_no, len(batches))
+        try:
+            text, call = _generate(prompt)
+            return text, {"phase": "map", "batch": batch_no, "articles": len(blocks), **call}
+        except Exception as e:
+            logger.warning(f"Map step {batch_no}/{len(batches)} failed: {e}")
+            return None, {"phase": "map", "batch": batch_no, "articles": len(blocks), "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(_map, enumerate(batches, start=1)))
+
+    notes = []
+    for text, call in results:
+        report["calls"].append(call)
+        if text:
+            notes.append(text)
+    if not notes:
+        raise RuntimeError("All map steps failed.")
+
+    text, call = _generate(_reduce_prompt(topic, notes, len(articles)))
+    report["calls"].append({"phase": "reduce", **call})
+    return text
+
+def run_thematic_analysis(topic, articles):
+    """
+    Runs the thematic analysis and returns (markdown, report). The report
+    carries per-call latency and token usage plus request-level totals.
+    RESEARCH_AI_MODE selects 'map_reduce' (default) or the legacy 'single' pass.
+    """
+    mode = getattr(settings, 'RESEARCH_AI_MODE', 'map_reduce')
+    report = {"mode": mode, "articles": len(articles), "calls": []}
+
+    if not articles:
+        return "No articles found to analyze.", report
+
+    # 1. Make sure the LLM backend can serve calls
     try:
-        # 3. Use the new SDK syntax: client.models.generate_content
-        response = client.models.generate_content(
-            model="gemini-2.5-flash", # Updated to the latest stable model
-            contents=prompt,
-            config={
-                'temperature': 0.3, # Lower temperature for analytical consistency
-            }
-        )
-        
-        if response.text:
-            return response.text
-        return "AI returned an empty analysis."
+        llm.check_available(getattr(settings, 'CHATBOT_API_KEY', None))
+    except Exception as e:
+        logger.error(f"Failed to initialize GenAI client: {e}")
+        return "AI Client initialization failed. Check your API key.", report
 
+    started = time.monotonic()
+    try:
+        if mode == 'single':
+            text = _single_pass(topic, articles, report)
+        else:
+            text = _map_reduce(topic, articles, report)
+        text = text or "AI returned an empty analysis."
     except Exception as e:
         logger.error(f"AI Analysis failed: {e}")
-        return f"Error generating analysis: {e}"
\ No newline at end of file
+        text = f"Error generating analysis: {e}"
+    finally:
+        report["wall_s"] = round(time.monotonic() - started, 2)
+        report["prompt_tokens"] = sum(c.get("prompt_tokens", 0) for c in report["calls"])
+        report["output_tokens"] = sum(c.get("output_tokens", 0) for c in report["calls"])
+        report["cached_calls"] = sum(1 for c in report["calls"] if c.get("cached"))
+
+    logger.info(
+        f"Thematic analysis ({report['mode']}): {len(report['calls'])} calls "
+        f"({report['cached_calls']} cached), "
+        f"{report['prompt_tokens']}+{report['output_tokens']} tokens in {report['wall_s']}s"
+    )
+    return text, report
+
+def perform_thematic_analysis(topic, articles):
+    """
+    Sends article content to Gemini to extract common themes and narratives.
+    """
+    text, _ = run_thematic_analysis(topic, articles)
+    return text
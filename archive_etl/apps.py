@@ -5,3 +5,6 @@ class ArchiveEtlConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'archive_etl'
     verbose_name = 'Basira Research Archive'
+
+    def ready(self):
+        from . import signals  # noqa: F401
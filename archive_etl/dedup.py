@@ -0,0 +1,94 @@
+import hashlib
+import re
+from collections import Counter
+
+# 64-bit SimHash split into 6 bands (11/11/11/11/10/10 bits). Two fingerprints
+# within MAX_DISTANCE bits must share at least one identical band (pigeonhole),
+# so band equality is used as the LSH candidate filter.
+FINGERPRINT_BITS = 64
+BAND_COUNT = 6
+MAX_DISTANCE = BAND_COUNT - 1
+SHINGLE_SIZE = 2
+BAND_WIDTHS = [
+    FINGERPRINT_BITS // BAND_COUNT + (1 if i < FINGERPRINT_BITS % BAND_COUNT else 0)
+    for i in range(BAND_COUNT)
+]
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+def _to_signed(value: int) -> int:
+    """Maps an unsigned 64-bit value onto the signed range of a BigIntegerField."""
+    return value - (1 << FINGERPRINT_BITS) if value >= (1 << (FINGERPRINT_BITS - 1)) else value
+
+def _to_unsigned(value: int) -> int:
+    return value & ((1 << FINGERPRINT_BITS) - 1)
+
+def _shingles(text: str):
+    words = _WORD_RE.findall((text or "").lower())
+    if len(words) < SHINGLE_SIZE:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+
+def simhash(text: str) -> int | None:
+    """
+    Computes a signed 64-bit SimHash over word-bigram shingles, weighted by
+    how often each shingle occurs.
+    Returns None for empty text.
+    """
+    shingles = _shingles(text)
+    if not shingles:
+        return None
+    weights = [0] * FINGERPRINT_BITS
+    for shingle, count in Counter(shingles).items():
+        h = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += count if (h >> bit) & 1 else -count
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return _to_signed(fingerprint)
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(_to_unsigned(a) ^ _to_unsigned(b)).count('1')
+
+def fingerprint_bands(fingerprint: int | None):
+    """Splits a fingerprint into BAND_COUNT integers (the LSH bucket keys)."""
+    if fingerprint is None:
+        return [None] * BAND_COUNT
+    value = _to_unsigned(fingerprint)
+    bands = []
+    for width in BAND_WIDTHS:
+        bands.append(value & ((1 << width) - 1))
+        value >>= width
+    return bands
+
+def is_near_duplicate(a: int | None, b: int | None) -> bool:
+    if a is None or b is None:
+        return False
+    return hamming_distance(a, b) <= MAX_DISTANCE
+
+class SimHashIndex:
+    """
+    In-memory LSH index used to catch near-duplicates within a single run,
+    before anything is written. Lookups only compare against fingerprints
+    sharing a band, so cost stays flat as the run grows.
+    """
+    def __init__(self):
+        self._buckets = [dict() for _ in range(BAND_COUNT)]
+
+    def add(self, fingerprint, key):
+        if fingerprint is None:
+            return
+        for band, value in enumerate(fingerprint_bands(fingerprint)):
+            self._buckets[band].setdefault(value, []).append((fingerprint, key))
+
+    def find(self, fingerprint):
+        """Returns the key of a near-duplicate already in the index, or None."""
+        if fingerprint is None:
+            return None
+        for band, value in enumerate(fingerprint_bands(fingerprint)):
+            for candidate, key in self._buckets[band].get(value, ()):
+                if is_near_duplicate(fingerprint, candidate):
+                    return key
+        return None
@@ -0,0 +1,92 @@
+import random
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from archive_etl.models import ResearchRequest
+from archive_etl.tasks import run_research_pipeline
+from core import throttle
+from webscraper import llm
+
+BENCH_URL = "https://bench.example.com/news"
+
+_VOCABULARY = (
+    "water ministry budget tourism aqaba investment energy solar refugees education university "
+    "parliament election trade exports phosphate potash health hospital transport amman irbid "
+    "zarqa agriculture drought reservoir tariff inflation bank employment youth startup"
+).split()
+
+class FakeDriver:
+    """Serves a synthetic listing page and articles in place of a Selenium browser."""
+
+    def __init__(self, articles, words, seed=7):
+        rng = random.Random(seed)
+        self.pages = {BENCH_URL: "".join(
+            f'<h2><a href="{BENCH_URL}/story-{i:05d}">Story {i}</a></h2>' for i in range(articles)
+        )}
+        for i in range(articles):
+            body = " ".join(rng.choice(_VOCABULARY) for _ in range(words))
+            self.pages[f"{BENCH_URL}/story-{i:05d}"] = (
+                f'<h1 class="story-title">Benchmark story {i}</h1><div class="story-body">{body}</div>'
+            )
+        self.current_url, self.title = BENCH_URL, ""
+
+    @property
+    def page_source(self):
+        return f"<html><body>{self.pages.get(self.current_url, '')}</body></html>"
+
+    def get(self, url):
+        self.current_url = url
+
+    def quit(self):
+        pass
+
+class Command(BaseCommand):
+    help = (
+        "Offline throughput benchmark of run_research_pipeline: Selenium is replaced by a "
+        "synthetic news site (politeness sleeps and domain throttling skipped) and Gemini by the deterministic "
+        "'fake' LLM backend. All rows written are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=50)
+        parser.add_argument('--words', type=int, default=600, help="Words per article")
+        parser.add_argument('--latency', type=float, default=0.5, help="Simulated LLM latency in seconds")
+        parser.add_argument('--mode', choices=['map_reduce', 'single'], default='map_reduce')
+
+    def handle(self, *args, **options):
+        articles = max(1, options['articles'])
+        driver = FakeDriver(articles, options['words'])
+
+        llm.reset()
+        throttle.reset()
+        with override_settings(LLM_BACKEND='fake', LLM_FAKE_LATENCY_S=options['latency'],
+                               LLM_CACHE_ENABLED=False, RESEARCH_AI_MODE=options['mode'],
+                               SCRAPE_THROTTLE_BACKEND='local', SCRAPE_DOMAIN_RATE_PER_S=1e6), \
+                patch('archive_etl.tasks.init_driver', return_value=driver), \
+                patch('archive_etl.tasks.time', SimpleNamespace(sleep=lambda seconds: None)), \
+                transaction.atomic():
+            user, _ = get_user_model().objects.get_or_create(username='benchmark_user')
+            req = ResearchRequest.objects.create(user=user, topic="Benchmark", target_url=BENCH_URL,
+                                                 max_articles=articles)
+            started = time.perf_counter()
+            run_research_pipeline(req.id)
+            wall = time.perf_counter() - started
+            req.refresh_from_db()
+            stored = req.articles.count()
+            report = req.analysis_report or {}
+            transaction.set_rollback(True)
+        throttle.reset()
+
+        self.stdout.write(f"Request:     {req.status}, {articles} articles x {options['words']} words "
+                          f"({options['mode']}, LLM latency {options['latency']}s)")
+        self.stdout.write(f"Stored:      {stored} articles")
+        self.stdout.write(f"Wall time:   {wall:.2f}s ({articles / wall:.1f} articles/s)")
+        self.stdout.write(f"Analysis:    {len(report.get('calls', []))} calls in {report.get('wall_s')}s, "
+                          f"{report.get('prompt_tokens')} prompt tokens")
+        for purpose, totals in llm.get_metrics().items():
+            self.stdout.write(f"LLM [{purpose}]: {totals['calls']} calls, {totals['latency_s']}s total latency")
@@ -0,0 +1,39 @@
+# Generated by Django 5.0 on 2026-10-19 10:12
+
+from urllib.parse import urlparse
+
+from django.db import migrations, models
+
+
+def normalize_domain(url):
+    # Frozen copy of the normalization at the time of this migration
+    if not url:
+        return ""
+    parsed = urlparse(url if '://' in url else f"//{url}")
+    host = (parsed.hostname or "").lower().rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    return host
+
+
+def populate_domains(apps, schema_editor):
+    ScrapeSource = apps.get_model('archive_etl', 'ScrapeSource')
+    for source in ScrapeSource.objects.all():
+        source.domain = normalize_domain(source.base_url)
+        source.save(update_fields=['domain'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive_etl', '0005_remove_article_ai_train_allowed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapesource',
+            name='domain',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Normalized host derived from base_url', max_length=255),
+        ),
+        migrations.RunPython(populate_domains, migrations.RunPython.noop),
+    ]
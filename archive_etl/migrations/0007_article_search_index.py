@@ -0,0 +1,81 @@
+# Generated by Django 5.0 on 2026-10-19 11:40
+
+import re
+
+from django.db import migrations
+
+FTS_TABLE = 'archive_etl_article_fts'
+PG_CONFIGS = ('simple', 'english', 'arabic')
+
+# Frozen copy of the archive_etl.search normalization at the time of this migration
+_ARABIC_DIACRITICS_RE = re.compile(r'[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]')
+_ARABIC_LETTER_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي',
+    'ة': 'ه',
+    'ؤ': 'و', 'ئ': 'ي',
+})
+
+
+def normalize_for_language(text, language_code):
+    if not text:
+        return ""
+    if (language_code or '').lower().startswith('ar'):
+        return _ARABIC_DIACRITICS_RE.sub('', text).translate(_ARABIC_LETTER_MAP)
+    return text
+
+
+def _pg_vector(config):
+    # Must match the SearchVector expression built in archive_etl.search
+    return (
+        f"(setweight(to_tsvector('{config}'::regconfig, COALESCE((\"title\")::text, '')), 'A') || "
+        f"setweight(to_tsvector('{config}'::regconfig, COALESCE((\"clean_text\")::text, '')), 'B'))"
+    )
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "title, body, lang UNINDEXED, "
+            "tokenize = 'porter unicode61 remove_diacritics 2')"
+        )
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT a.id, a.title, a.clean_text, COALESCE(s.language_code, 'en') "
+                "FROM archive_etl_article a LEFT JOIN archive_etl_scrapesource s ON s.id = a.source_id"
+            )
+            rows = [
+                (pk, normalize_for_language(title, lang), normalize_for_language(text, lang), lang)
+                for pk, title, text, lang in cursor.fetchall()
+            ]
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, body, lang) VALUES (%s, %s, %s, %s)", rows
+            )
+    elif vendor == 'postgresql':
+        for config in PG_CONFIGS:
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS archive_etl_article_fts_{config} "
+                f"ON archive_etl_article USING gin ({_pg_vector(config)})"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == 'postgresql':
+        for config in PG_CONFIGS:
+            schema_editor.execute(f"DROP INDEX IF EXISTS archive_etl_article_fts_{config}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive_etl', '0006_scrapesource_domain'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.0 on 2026-10-19 12:05
+
+import hashlib
+import re
+from collections import Counter
+
+from django.db import migrations, models
+
+# Frozen copy of archive_etl.dedup at the time of this migration
+FINGERPRINT_BITS = 64
+BAND_COUNT = 6
+SHINGLE_SIZE = 2
+BAND_WIDTHS = [
+    FINGERPRINT_BITS // BAND_COUNT + (1 if i < FINGERPRINT_BITS % BAND_COUNT else 0)
+    for i in range(BAND_COUNT)
+]
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def simhash(text):
+    words = _WORD_RE.findall((text or "").lower())
+    if len(words) < SHINGLE_SIZE:
+        shingles = [" ".join(words)] if words else []
+    else:
+        shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    if not shingles:
+        return None
+    weights = [0] * FINGERPRINT_BITS
+    for shingle, count in Counter(shingles).items():
+        h = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += count if (h >> bit) & 1 else -count
+    fingerprint = sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+    return fingerprint - (1 << FINGERPRINT_BITS) if fingerprint >= (1 << (FINGERPRINT_BITS - 1)) else fingerprint
+
+
+def fingerprint_bands(fingerprint):
+    if fingerprint is None:
+        return [None] * BAND_COUNT
+    value = fingerprint & ((1 << FINGERPRINT_BITS) - 1)
+    bands = []
+    for width in BAND_WIDTHS:
+        bands.append(value & ((1 << width) - 1))
+        value >>= width
+    return bands
+
+
+def populate_fingerprints(apps, schema_editor):
+    Article = apps.get_model('archive_etl', 'Article')
+    band_fields = [f"fp_band_{i}" for i in range(6)]
+    for article in Article.objects.only('id', 'clean_text').iterator(chunk_size=500):
+        article.fingerprint = simhash(article.clean_text)
+        for field, value in zip(band_fields, fingerprint_bands(article.fingerprint)):
+            setattr(article, field, value)
+        article.save(update_fields=['fingerprint'] + band_fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive_etl', '0007_article_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='fingerprint',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='fp_band_0',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='fp_band_1',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='fp_band_2',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='fp_band_3',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='fp_band_4',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='fp_band_5',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-19 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive_etl', '0008_article_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='researchrequest',
+            name='analysis_report',
+            field=models.JSONField(blank=True, help_text='Token usage and latency of the AI analysis', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-19 03:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive_etl', '0009_researchrequest_analysis_report'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='researchrequest',
+            name='reused_articles',
+            field=models.ManyToManyField(blank=True, related_name='reused_by', to='archive_etl.article'),
+        ),
+    ]
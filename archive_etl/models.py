@@ -1,10 +1,21 @@
+import time
 from django.db import models
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
+from core.throttle import domain_of
+from webscraper.status import publish
+from .dedup import simhash, fingerprint_bands, is_near_duplicate
+
+# Host -> ScrapeSource (or None for unknown hosts) lives in the shared cache under a
+# version that every save/delete replaces, so web and worker processes see new sources
+SOURCE_CACHE_VERSION_KEY = "scrape_source:version"
+_NOT_CACHED = object()
 
 class ScrapeSource(models.Model):
     name = models.CharField(max_length=100, unique=True, help_text="e.g., Jordan News")
     base_url = models.URLField(max_length=255, unique=True)
+    domain = models.CharField(max_length=255, blank=True, db_index=True, editable=False, help_text="Normalized host derived from base_url")
     start_url = models.URLField(max_length=255, blank=True, null=True)
     language_code = models.CharField(max_length=5, default='en', help_text="ISO code (ar, en)")
     is_active = models.BooleanField(default=True)
@@ -12,6 +23,47 @@ class ScrapeSource(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.domain = domain_of(self.base_url)
+        super().save(*args, **kwargs)
+        self.invalidate_cache()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.invalidate_cache()
+        return result
+
+    @staticmethod
+    def invalidate_cache():
+        """Drops every cached lookup (a fresh version, never one used before)."""
+        cache.set(SOURCE_CACHE_VERSION_KEY, time.time_ns(), None)
+
+    @classmethod
+    def for_url(cls, url):
+        """
+        Resolves the source registered for a URL's host (or its parent domains).
+        Results, including misses, are cached per host until a source is saved
+        or deleted, and for SOURCE_CACHE_TTL_S at most (the bound for
+        processes that don't share the cache).
+        """
+        host = domain_of(url)
+        if not host:
+            return None
+        version = cache.get_or_set(SOURCE_CACHE_VERSION_KEY, time.time_ns, None)
+        key = f"scrape_source:{version}:{host}"
+        cached = cache.get(key, _NOT_CACHED)
+        if cached is not _NOT_CACHED:
+            return cached
+
+        # 'en.ammonnews.net' -> ['en.ammonnews.net', 'ammonnews.net']
+        labels = host.split('.')
+        candidates = ['.'.join(labels[i:]) for i in range(len(labels) - 1)] or [host]
+        matches = {s.domain: s for s in cls.objects.filter(domain__in=candidates).order_by('-id')}
+        source = next((matches[c] for c in candidates if c in matches), None)
+
+        cache.set(key, source, getattr(settings, 'SOURCE_CACHE_TTL_S', 300))
+        return source
+
 class ResearchRequest(models.Model):
     class Status(models.TextChoices):
         PENDING = 'PENDING', 'Pending'
@@ -37,10 +89,34 @@ class ResearchRequest(models.Model):
     
     # AI Output
     thematic_analysis = models.TextField(blank=True, null=True, help_text="Markdown text generated by Gemini")
+    analysis_report = models.JSONField(blank=True, null=True, help_text="Token usage and latency of the AI analysis")
+    # Articles already in the user's archive that this run found again under another URL
+    reused_articles = models.ManyToManyField('Article', blank=True, related_name='reused_by')
 
     def __str__(self):
         return f"{self.topic} ({self.status})"
 
+    @property
+    def source_articles(self):
+        """Articles scraped by this request plus the archived near-duplicates it reused."""
+        return Article.objects.filter(models.Q(request=self) | models.Q(reused_by=self)).distinct()
+
+    @classmethod
+    def publish_status(cls, request_id):
+        """
+        Writes the request's polling status (see archive_etl.views.batch_status)
+        to the cache. Called by the pipeline on every status change and article
+        flush; returns the cache entry, or None if the request no longer exists.
+        """
+        req = cls.objects.filter(id=request_id).only('id', 'user_id', 'topic', 'status').first()
+        if req is None:
+            return None
+        return publish('research', req.id, req.user_id, {
+            "status": req.status,
+            "product_count": req.source_articles.count(),
+            "jobs": [{"status": req.status, "query": req.topic}],
+        })
+
 class Article(models.Model):
     request = models.ForeignKey(ResearchRequest, on_delete=models.CASCADE, related_name='articles', null=True, blank=True)
     source = models.ForeignKey(ScrapeSource, on_delete=models.SET_NULL, null=True, blank=True)
@@ -52,9 +128,52 @@ class Article(models.Model):
     scraped_at = models.DateTimeField(default=timezone.now)
     downloaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='downloaded_articles')
 
+    # SimHash of clean_text and its LSH bands, used for near-duplicate detection
+    fingerprint = models.BigIntegerField(null=True, blank=True, editable=False)
+    fp_band_0 = models.PositiveIntegerField(null=True, blank=True, editable=False, db_index=True)
+    fp_band_1 = models.PositiveIntegerField(null=True, blank=True, editable=False, db_index=True)
+    fp_band_2 = models.PositiveIntegerField(null=True, blank=True, editable=False, db_index=True)
+    fp_band_3 = models.PositiveIntegerField(null=True, blank=True, editable=False, db_index=True)
+    fp_band_4 = models.PositiveIntegerField(null=True, blank=True, editable=False, db_index=True)
+    fp_band_5 = models.PositiveIntegerField(null=True, blank=True, editable=False, db_index=True)
+
+    FINGERPRINT_FIELDS = ['fingerprint', 'fp_band_0', 'fp_band_1', 'fp_band_2', 'fp_band_3', 'fp_band_4', 'fp_band_5']
+
     class Meta:
         ordering = ('-scraped_at',)
         verbose_name = "Archived Article"
 
     def __str__(self):
-        return self.title[:50]
\ No newline at end of file
+        return self.title[:50]
+
+    def save(self, *args, **kwargs):
+        self.set_fingerprint()
+        super().save(*args, **kwargs)
+
+    def set_fingerprint(self):
+        self.fingerprint = simhash(self.clean_text)
+        for i, value in enumerate(fingerprint_bands(self.fingerprint)):
+            setattr(self, f"fp_band_{i}", value)
+
+    @classmethod
+    def find_near_duplicate(cls, fingerprint, exclude_url=None, user=None):
+        """
+        Returns an archived article whose text is a near-duplicate of the
+        fingerprint. Candidates are narrowed with the indexed band columns,
+        and to the given user's research requests when a user is passed.
+        """
+        if fingerprint is None:
+            return None
+        bands = fingerprint_bands(fingerprint)
+        lookup = models.Q()
+        for i, value in enumerate(bands):
+            lookup |= models.Q(**{f"fp_band_{i}": value})
+        candidates = cls.objects.filter(lookup)
+        if user is not None:
+            candidates = candidates.filter(request__user=user)
+        if exclude_url:
+            candidates = candidates.exclude(url=exclude_url)
+        for pk, candidate_fp in candidates.values_list('id', 'fingerprint'):
+            if is_near_duplicate(fingerprint, candidate_fp):
+                return cls.objects.get(pk=pk)
+        return None
\ No newline at end of file
@@ -0,0 +1,214 @@
+import logging
+import re
+from django.db import connection
+
+from .models import Article
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'archive_etl_article_fts'
+
+# Title matches weigh more than body matches in the bm25 ranking
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+# Postgres text-search configurations per ScrapeSource.language_code
+PG_SEARCH_CONFIGS = {'en': 'english', 'ar': 'arabic'}
+
+_TERM_RE = re.compile(r'\w+\*?', re.UNICODE)
+_ARABIC_RE = re.compile(r'[\u0600-\u06FF]')
+# Tashkeel, Quranic marks and tatweel
+_ARABIC_DIACRITICS_RE = re.compile(r'[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]')
+_ARABIC_LETTER_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي',
+    'ة': 'ه',
+    'ؤ': 'و', 'ئ': 'ي',
+})
+
+def normalize_arabic(text: str) -> str:
+    """Strips tashkeel/tatweel and folds alef, yaa and taa marbuta variants."""
+    if not text:
+        return ""
+    return _ARABIC_DIACRITICS_RE.sub('', text).translate(_ARABIC_LETTER_MAP)
+
+def normalize_for_language(text: str, language_code: str | None) -> str:
+    """Applies the language-specific normalization used at index and query time."""
+    if not text:
+        return ""
+    if (language_code or '').lower().startswith('ar'):
+        return normalize_arabic(text)
+    return text
+
+def parse_terms(raw_query: str):
+    """
+    Splits a user query into (term, is_prefix) pairs.
+    A trailing '*' on a word requests a prefix match, e.g. 'econom*'.
+    """
+    raw_query = raw_query or ""
+    if _ARABIC_RE.search(raw_query):
+        raw_query = normalize_arabic(raw_query)
+    terms = []
+    for token in _TERM_RE.findall(raw_query):
+        is_prefix = token.endswith('*')
+        term = token.rstrip('*')
+        if term:
+            terms.append((term, is_prefix))
+    return terms
+
+def build_fts_query(raw_query: str) -> str:
+    """Builds a safe FTS5 MATCH expression (implicit AND of quoted terms)."""
+    return " ".join(
+        f'"{term}"*' if is_prefix else f'"{term}"'
+        for term, is_prefix in parse_terms(raw_query)
+    )
+
+def build_tsquery(raw_query: str) -> str:
+    """Builds a raw Postgres tsquery string ('term & pref:*')."""
+    return " & ".join(
+        f"{term}:*" if is_prefix else term
+        for term, is_prefix in parse_terms(raw_query)
+    )
+
+# --- Index maintenance (SQLite FTS5) ---
+
+def _uses_fts5():
+    return connection.vendor == 'sqlite'
+
+def index_articles(articles):
+    """
+    (Re)indexes the given saved articles. On Postgres the GIN expression
+    index is maintained by the database itself, so this is a no-op there.
+    """
+    if not _uses_fts5():
+        return
+    rows = []
+    for art in articles:
+        if art.pk is None:
+            continue
+        lang = art.source.language_code if art.source_id and art.source else 'en'
+        rows.append((
+            art.pk,
+            normalize_for_language(art.title, lang),
+            normalize_for_language(art.clean_text, lang),
+            lang,
+        ))
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(r[0],) for r in rows])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, body, lang) VALUES (%s, %s, %s, %s)",
+            rows,
+        )
+
+def unindex_articles(article_ids):
+    if not _uses_fts5() or not article_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in article_ids])
+
+def rebuild_index(chunk_size=500):
+    """Drops and re-populates the FTS5 index from the Article table."""
+    if not _uses_fts5():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+    total = 0
+    qs = Article.objects.select_related('source').order_by('pk')
+    batch = []
+    for art in qs.iterator(chunk_size=chunk_size):
+        batch.append(art)
+        if len(batch) >= chunk_size:
+            index_articles(batch)
+            total += len(batch)
+            batch = []
+    index_articles(batch)
+    return total + len(batch)
+
+# --- Querying ---
+
+def search_articles(raw_query, user=None, language=None, limit=50):
+    """
+    Ranked full-text search over archived articles.
+    Returns Article instances (best match first), each with a `rank` attribute.
+    """
+    if _uses_fts5():
+        return _search_sqlite(raw_query, user, language, limit)
+    if connection.vendor == 'postgresql':
+        return _search_postgres(raw_query, user, language, limit)
+
+    logger.warning(f"No full-text backend for {connection.vendor}; falling back to LIKE search.")
+    qs = Article.objects.filter(title__icontains=raw_query)
+    if user is not None:
+        qs = qs.filter(request__user=user)
+    results = list(qs[:limit])
+    for art in results:
+        art.rank = 0.0
+    return results
+
+def _search_sqlite(raw_query, user, language, limit):
+    match = build_fts_query(raw_query)
+    if not match:
+        return []
+
+    sql = (
+        f"SELECT f.rowid, bm25({FTS_TABLE}, {TITLE_WEIGHT}, {BODY_WEIGHT}) AS score "
+        f"FROM {FTS_TABLE} f "
+    )
+    params = []
+    if user is not None:
+        sql += (
+            f"JOIN {Article._meta.db_table} a ON a.id = f.rowid "
+            "JOIN archive_etl_researchrequest r ON r.id = a.request_id "
+        )
+    sql += f"WHERE {FTS_TABLE} MATCH %s "
+    params.append(match)
+    if user is not None:
+        sql += "AND r.user_id = %s "
+        params.append(user.pk)
+    if language:
+        sql += "AND f.lang = %s "
+        params.append(language)
+    sql += "ORDER BY score LIMIT %s"
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        hits = cursor.fetchall()
+
+    by_id = Article.objects.select_related('source').in_bulk([pk for pk, _ in hits])
+    results = []
+    for pk, score in hits:
+        art = by_id.get(pk)
+        if art is None:
+            continue
+        # bm25() is negative with better matches lower; expose a positive score
+        art.rank = round(-score, 4)
+        results.append(art)
+    return results
+
+def _search_postgres(raw_query, user, language, limit):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+    tsquery = build_tsquery(raw_query)
+    if not tsquery:
+        return []
+
+    config = PG_SEARCH_CONFIGS.get(language, 'simple')
+    vector = SearchVector('title', weight='A', config=config) + SearchVector('clean_text', weight='B', config=config)
+    query = SearchQuery(tsquery, search_type='raw', config=config)
+
+    # Matches the GIN expression indexes created in migration 0007
+    qs = (
+        Article.objects.select_related('source')
+        .annotate(search=vector)
+        .filter(search=query)
+        .annotate(rank=SearchRank(vector, query))
+    )
+    if user is not None:
+        qs = qs.filter(request__user=user)
+    if language:
+        qs = qs.filter(source__language_code=language)
+    return list(qs.order_by('-rank')[:limit])
+
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Article
+from .search import index_articles, unindex_articles
+
+# Keeps the full-text index in sync for single-row writes.
+# Bulk upserts in tasks.py index their rows explicitly.
+
+@receiver(post_save, sender=Article)
+def index_saved_article(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_articles([instance])
+
+@receiver(post_delete, sender=Article)
+def unindex_deleted_article(sender, instance, **kwargs):
+    unindex_articles([instance.pk])
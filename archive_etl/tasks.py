@@ -1,33 +1,70 @@
 import logging
 import time
+from contextlib import ExitStack
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 from webscraper.celery import app
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
 from .models import ResearchRequest, Article, ScrapeSource
-from .ai import perform_thematic_analysis
+from .ai import run_thematic_analysis
+from .search import index_articles
+from .dedup import SimHashIndex
 from .utils import check_url_compliance
 
 # Reuse BOTH init_driver and _save_debug_snapshot from core scraper
 from core.scraper import init_driver, _save_debug_snapshot
+from core.throttle import DomainBusy, get_governor
 
 logger = logging.getLogger(__name__)
 
-@app.task(bind=True)
+# Articles are buffered and upserted in chunks of this size
+ARTICLE_WRITE_CHUNK = 50
+ARTICLE_UPDATE_FIELDS = ['request', 'source', 'title', 'clean_text', 'scraped_at'] + Article.FINGERPRINT_FIELDS
+
+def _flush_articles(pending):
+    """
+    Upserts buffered articles keyed on their URL inside one transaction.
+    Returns the saved instances so they can be handed to the AI step.
+    """
+    if not pending:
+        return []
+    with transaction.atomic():
+        saved = Article.objects.bulk_create(
+            pending,
+            batch_size=ARTICLE_WRITE_CHUNK,
+            update_conflicts=True,
+            unique_fields=['url'],
+            update_fields=ARTICLE_UPDATE_FIELDS,
+        )
+        # bulk_create skips post_save, so keep the full-text index in sync here
+        index_articles(saved)
+    logger.info(f"Upserted {len(saved)} articles.")
+    return saved
+
+@app.task(bind=True, max_retries=5)
 def run_research_pipeline(self, request_id):
     req = ResearchRequest.objects.get(id=request_id)
     req.status = ResearchRequest.Status.RUNNING
     req.save()
+    ResearchRequest.publish_status(req.id)
     
     driver = None
+    governor = get_governor()
+    held_slots = ExitStack()
     try:
         logger.info(f"Starting research pipeline for: {req.topic}")
+        # One of the site's concurrency slots for the whole run, shared with the e-commerce scrapers.
+        # Taken without waiting: a busy site is retried later instead of blocking this worker
+        held_slots.enter_context(governor.slot(req.target_url, wait=0))
         driver = init_driver(headless=True)
         
         logger.info(f"Navigating to target: {req.target_url}")
+        governor.throttle(req.target_url)
         driver.get(req.target_url)
         time.sleep(5)
 
@@ -94,17 +131,14 @@ def run_research_pipeline(self, request_id):
         logger.info(f"Found {len(article_links)} potential article links.")
 
         # --- STEP 2: Identify Source ---
-        source_obj = None
-        all_sources = ScrapeSource.objects.all()
-        for source in all_sources:
-            clean_domain = source.base_url.replace('https://', '').replace('http://', '').rstrip('/')
-            if clean_domain in req.target_url:
-                source_obj = source
-                break
+        source_obj = ScrapeSource.for_url(req.target_url)
         
         # --- STEP 3: Scrape Individual Articles ---
         scraped_count = 0
+        duplicate_count = 0
         articles_for_ai = []
+        pending_articles = []
+        seen_fingerprints = SimHashIndex()
 
         # Apply User Limit
         limit = req.max_articles if req.max_articles > 0 else 10
@@ -112,11 +146,13 @@ def run_research_pipeline(self, request_id):
         links_to_scrape = list(article_links)[:limit]
 
         for i, url in enumerate(links_to_scrape): 
-            if not check_url_compliance(url, source_obj.name if source_obj else "Unknown"):
+            article_source = ScrapeSource.for_url(url) or source_obj
+            if not check_url_compliance(url, article_source.name if article_source else "Unknown"):
                 continue
             
             try:
                 logger.info(f"Scraping ({i+1}/{len(links_to_scrape)}): {url}")
+                governor.throttle(url)
                 driver.get(url)
                 time.sleep(2)
                 
@@ -171,46 +207,87 @@ def run_research_pipeline(self, request_id):
                     if longest_div and max_len > 200:
                         text_content = longest_div.get_text(separator="\n\n", strip=True)
 
-                # 4. Save Data
-                if text_content and len(text_content) > 100:
-                    article, created = Article.objects.update_or_create(
-                        url=url,
-                        defaults={
-                            'request': req,
-                            'source': source_obj,
-                            'title': title[:499],
-                            'clean_text': text_content,
-                            'scraped_at': timezone.now()
-                        }
-                    )
-                    articles_for_ai.append(article)
-                    scraped_count += 1
-                    action_msg = "Created" if created else "Updated"
-                    logger.info(f"   -> {action_msg} article: {title[:30]}...")
-                else:
+                if not text_content or len(text_content) <= 100:
                     logger.warning(f"   -> Skipped (Text too short)")
+                    continue
+
+                article = Article(
+                    url=url,
+                    request=req,
+                    source=article_source,
+                    title=title[:499],
+                    clean_text=text_content,
+                    scraped_at=timezone.now()
+                )
+                article.set_fingerprint()
+
+                # 4. Near-Duplicate Check (this run first, then the archive)
+                dup_url = seen_fingerprints.find(article.fingerprint)
+                if dup_url:
+                    duplicate_count += 1
+                    logger.info(f"   -> Skipped (near-duplicate of {dup_url})")
+                    continue
+                seen_fingerprints.add(article.fingerprint, url)
+
+                archived = Article.find_near_duplicate(article.fingerprint, exclude_url=url, user=req.user_id)
+                if archived:
+                    # Already in this user's archive under another URL: analyze and link it, don't store a copy
+                    duplicate_count += 1
+                    articles_for_ai.append(archived)
+                    req.reused_articles.add(archived)
+                    logger.info(f"   -> Near-duplicate of archived article {archived.url}")
+                    continue
+
+                # 5. Buffer Data (written in chunks below)
+                pending_articles.append(article)
+                scraped_count += 1
+                logger.info(f"   -> Queued article: {title[:30]}...")
+
+                if len(pending_articles) >= ARTICLE_WRITE_CHUNK:
+                    articles_for_ai.extend(_flush_articles(pending_articles))
+                    pending_articles = []
+                    ResearchRequest.publish_status(req.id)
 
             except Exception as e:
                 logger.warning(f"Failed to scrape article {url}: {e}")
-        logger.info(f"Successfully processed {scraped_count} articles.")
+
+        articles_for_ai.extend(_flush_articles(pending_articles))
+        logger.info(f"Successfully processed {scraped_count} articles ({duplicate_count} near-duplicates skipped).")
 
         # --- STEP 4: AI Analysis ---
-        if scraped_count > 0:
+        if articles_for_ai:
             logger.info("Running AI Thematic Analysis...")
-            analysis = perform_thematic_analysis(req.topic, articles_for_ai)
+            analysis, report = run_thematic_analysis(req.topic, articles_for_ai)
             req.thematic_analysis = analysis
+            req.analysis_report = report
         else:
             req.thematic_analysis = f"No articles scraped. (Found {len(article_links)} links)."
 
         req.status = ResearchRequest.Status.COMPLETED
         req.save()
+        ResearchRequest.publish_status(req.id)
         
+    except DomainBusy as e:
+        if self.request.retries >= self.max_retries:
+            logger.error(f"Pipeline failed: {e}")
+            req.status = ResearchRequest.Status.FAILED
+            req.save()
+            ResearchRequest.publish_status(req.id)
+            return
+        logger.info(f"Research request {req.id} deferred: {e}")
+        req.status = ResearchRequest.Status.PENDING
+        req.save()
+        ResearchRequest.publish_status(req.id)
+        raise self.retry(exc=e, countdown=getattr(settings, 'SCRAPE_DOMAIN_RETRY_S', 120))
+
     except Exception as e:
         logger.error(f"Pipeline failed: {e}")
         req.status = ResearchRequest.Status.FAILED
         req.save()
+        ResearchRequest.publish_status(req.id)
         
     finally:
         if driver:
             driver.quit()
-            logger.info("Driver closed.")
\ No newline at end of file
+            logger.info("Driver closed.")
+        held_slots.close()
\ No newline at end of file
@@ -1,3 +1,232 @@
-from django.test import TestCase
+from types import SimpleNamespace
+from unittest.mock import patch
+from celery.exceptions import Retry
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from archive_etl.models import ResearchRequest, Article, ScrapeSource
+from archive_etl.search import search_articles
+from archive_etl.dedup import SimHashIndex, MAX_DISTANCE, simhash, hamming_distance
+from archive_etl.tasks import _flush_articles, run_research_pipeline
+from archive_etl.ai import chunk_articles, run_thematic_analysis
+from core import throttle
 
-# Create your tests here.
+class ResearchPipelineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='rama_tester', password='password123')
+        self.source = ScrapeSource.objects.create(name="Jordan News", base_url="https://jordannews.jo/")
+        self.req = ResearchRequest.objects.create(
+            user=self.user, topic="Water Scarcity", target_url="https://jordannews.jo/AdvancedSearch/water"
+        )
+
+    def test_01_bulk_upsert_articles(self):
+        """TEST CASE 1: Buffered articles are inserted, then updated in place on a repeat URL"""
+        _flush_articles([
+            Article(url=f"https://jordannews.jo/article/{i}", request=self.req, source=self.source,
+                    title=f"Story {i}", clean_text="Original text")
+            for i in range(3)
+        ])
+        self.assertEqual(Article.objects.count(), 3)
+
+        saved = _flush_articles([
+            Article(url="https://jordannews.jo/article/1", request=self.req, source=self.source,
+                    title="Story 1 (updated)", clean_text="Revised text"),
+        ])
+
+        self.assertEqual(len(saved), 1)
+        self.assertEqual(Article.objects.count(), 3)
+        updated = Article.objects.get(url="https://jordannews.jo/article/1")
+        self.assertEqual(updated.title, "Story 1 (updated)")
+        self.assertEqual(updated.clean_text, "Revised text")
+
+    def test_02_flush_empty_buffer(self):
+        """TEST CASE 2: Flushing an empty buffer issues no writes"""
+        with self.assertNumQueries(0):
+            self.assertEqual(_flush_articles([]), [])
+
+    def test_03_source_resolution_by_domain(self):
+        """TEST CASE 3: Sources resolve from article URLs by normalized domain and are cached"""
+        ammon = ScrapeSource.objects.create(name="Ammon News (English)", base_url="http://en.ammonnews.net/")
+        self.assertEqual(self.source.domain, "jordannews.jo")
+        self.assertEqual(ScrapeSource.for_url("https://www.jordannews.jo/article/42"), self.source)
+        self.assertEqual(ScrapeSource.for_url("http://en.ammonnews.net/article/7"), ammon)
+        self.assertIsNone(ScrapeSource.for_url("https://example.com/news/1"))
+
+        with self.assertNumQueries(0):
+            ScrapeSource.for_url("https://jordannews.jo/another")
+            ScrapeSource.for_url("https://example.com/news/2")
+
+    def test_04_source_cache_invalidated_on_save(self):
+        """TEST CASE 4: Registering a new source is visible to the next lookup"""
+        self.assertIsNone(ScrapeSource.for_url("https://example.com/news/1"))
+        example = ScrapeSource.objects.create(name="Example", base_url="https://example.com/")
+        self.assertEqual(ScrapeSource.for_url("https://example.com/news/1"), example)
+        example.delete()
+        self.assertIsNone(ScrapeSource.for_url("https://example.com/news/1"))
+
+    def test_05_full_text_search_ranking(self):
+        """TEST CASE 5: Articles are searchable by body text, ranked with title matches first"""
+        Article.objects.create(url="https://jordannews.jo/a", request=self.req, source=self.source,
+                               title="Budget debate", clean_text="Parliament discussed water scarcity at length.")
+        Article.objects.create(url="https://jordannews.jo/b", request=self.req, source=self.source,
+                               title="Water scarcity worsens", clean_text="Reservoirs are at record lows this summer.")
+        _flush_articles([
+            Article(url="https://jordannews.jo/c", request=self.req, source=self.source,
+                    title="Economy", clean_text="Economic reform continues with new investment laws."),
+        ])
+
+        titles = [a.title for a in search_articles("water scarcity", user=self.user)]
+        self.assertEqual(titles, ["Water scarcity worsens", "Budget debate"])
+        self.assertEqual([a.title for a in search_articles("econom*", user=self.user)], ["Economy"])
+
+        other = User.objects.create_user(username='other', password='password123')
+        self.assertEqual(search_articles("water", user=other), [])
+
+    def test_06_arabic_normalization(self):
+        """TEST CASE 6: Arabic articles match regardless of diacritics and alef/taa marbuta variants"""
+        arabic = ScrapeSource.objects.create(name="Ammon News", base_url="https://www.ammonnews.net/", language_code="ar")
+        Article.objects.create(url="https://www.ammonnews.net/article/1", request=self.req, source=arabic,
+                               title="أزمة المياه في الأردن", clean_text="تَعاني المملكة من شُحّ المياه.")
+
+        results = search_articles("ازمه", user=self.user, language="ar")
+        self.assertEqual(len(results), 1)
+        self.assertEqual(search_articles("ازمه", user=self.user, language="en"), [])
+
+        Article.objects.filter(source=arabic).first().delete()
+        self.assertEqual(search_articles("ازمه", user=self.user), [])
+
+    def test_07_search_api(self):
+        """TEST CASE 7: The search API returns ranked JSON results"""
+        Article.objects.create(url="https://jordannews.jo/a", request=self.req, source=self.source,
+                               title="Water scarcity worsens", clean_text="Reservoirs are at record lows.")
+        self.client.login(username='rama_tester', password='password123')
+        data = self.client.get(reverse('article_search_api'), {'q': 'reservoir*'}).json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['results'][0]['source'], "Jordan News")
+        self.assertEqual(self.client.get(reverse('article_search'), {'q': 'water'}).status_code, 200)
+
+    def test_08_near_duplicate_detection(self):
+        """TEST CASE 8: Republished stories are flagged as near-duplicates, unrelated ones are not"""
+        story = (
+            "The Ministry of Water and Irrigation announced a new national plan to reduce losses in the "
+            "distribution network, citing record low rainfall this winter and rising demand in Amman, Zarqa "
+            "and Irbid. Officials said the plan includes replacing aging pipes, expanding the Disi conveyor, "
+            "cracking down on illegal wells and accelerating the Aqaba-Amman desalination project, which is "
+            "expected to supply three hundred million cubic meters per year once complete. The minister told "
+            "reporters that non-revenue water still accounts for almost half of the supply, and that "
+            "international donors have pledged additional grants for network rehabilitation over the next "
+            "five years. Farmers in the Jordan Valley have warned that summer allocations may be cut again, "
+            "while municipalities are preparing rationing schedules for the hottest months of the year."
+        )
+        republished = story.replace("announced a new", "on Sunday announced a new").replace("hottest months", "hottest weeks")
+        unrelated = (
+            "Tourism revenues rose sharply in the first quarter as visitor numbers to Petra and Wadi Rum "
+            "recovered, according to figures released by the central bank. Hotel occupancy in Aqaba reached "
+            "its highest level in a decade, and airlines added new routes from European capitals, while the "
+            "tourism board launched a campaign aimed at travelers from the Gulf and East Asia."
+        )
+
+        original = Article.objects.create(url="https://jordannews.jo/water", request=self.req,
+                                          source=self.source, title="Water plan", clean_text=story)
+        self.assertIsNotNone(original.fingerprint)
+
+        self.assertLessEqual(hamming_distance(simhash(story), simhash(republished)), MAX_DISTANCE)
+        self.assertEqual(Article.find_near_duplicate(simhash(republished)), original)
+        self.assertIsNone(Article.find_near_duplicate(simhash(unrelated)))
+        self.assertIsNone(Article.find_near_duplicate(original.fingerprint, exclude_url=original.url))
+
+        index = SimHashIndex()
+        index.add(simhash(story), "a")
+        self.assertEqual(index.find(simhash(republished)), "a")
+        self.assertIsNone(index.find(simhash(unrelated)))
+
+    def test_09_map_reduce_analysis(self):
+        """TEST CASE 9: Articles are batched by token budget, mapped concurrently and reduced once"""
+        articles = [Article(title=f"Story {i}", clean_text="word " * 400) for i in range(10)]
+        batches = chunk_articles(articles, token_budget=1200, max_chars=8000)
+        self.assertEqual([len(b) for b in batches], [2, 2, 2, 2, 2])
+
+        prompts = []
+        class FakeModels:
+            def generate_content(self, model, contents, config):
+                prompts.append(contents)
+                return SimpleNamespace(text="notes", usage_metadata=SimpleNamespace(prompt_token_count=100, candidates_token_count=10))
+
+        with override_settings(RESEARCH_AI_MODE='map_reduce', RESEARCH_AI_BATCH_TOKENS=1200, RESEARCH_AI_CONCURRENCY=3), \
+                patch('webscraper.llm.get_client', return_value=SimpleNamespace(models=FakeModels())):
+            text, report = run_thematic_analysis("Water", articles)
+
+        self.assertEqual(text, "notes")
+        self.assertEqual(report['batches'], 5)
+        self.assertEqual([c['phase'] for c in report['calls']], ['map'] * 5 + ['reduce'])
+        self.assertEqual(report['prompt_tokens'], 600)
+        self.assertIn("analyzed in 5 parts", prompts[-1])
+
+    def test_10_status_served_from_cache_with_etag(self):
+        """TEST CASE 10: Request status comes from the published cache entry; unchanged polls get a 304"""
+        from django.core.cache import cache
+        cache.clear()
+        self.client.login(username='rama_tester', password='password123')
+        url = reverse('batch_status', args=[self.req.id])
+
+        first = self.client.get(url)
+        self.assertEqual(first.json()['status'], ResearchRequest.Status.PENDING)
+        with self.assertNumQueries(2):  # session, user
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+        Article.objects.create(url="https://jordannews.jo/article/9", request=self.req, source=self.source,
+                               title="Story 9", clean_text="Text")
+        ResearchRequest.objects.filter(id=self.req.id).update(status=ResearchRequest.Status.COMPLETED)
+        ResearchRequest.publish_status(self.req.id)
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual((changed.json()['status'], changed.json()['product_count']), ('COMPLETED', 1))
+
+        User.objects.create_user(username='other_tester', password='password123')
+        self.client.login(username='other_tester', password='password123')
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_11_near_duplicates_stay_within_a_users_archive(self):
+        """TEST CASE 11: Another user's archive is never matched; a reused article is linked to the request"""
+        text = "Desalination capacity in Aqaba will double by 2030 under the national water plan. " * 8
+        original = Article.objects.create(url="https://jordannews.jo/desal", request=self.req,
+                                          source=self.source, title="Desalination", clean_text=text)
+        other = User.objects.create_user(username='other_tester', password='password123')
+        other_req = ResearchRequest.objects.create(user=other, topic="Water", target_url="https://jordannews.jo/")
+
+        self.assertIsNone(Article.find_near_duplicate(simhash(text), exclude_url="https://x.jo/copy", user=other))
+        self.assertEqual(Article.find_near_duplicate(simhash(text), exclude_url="https://x.jo/copy", user=self.user),
+                         original)
+
+        repeat = ResearchRequest.objects.create(user=self.user, topic="Water again", target_url="https://jordannews.jo/")
+        repeat.reused_articles.add(original)
+        self.assertEqual(list(repeat.source_articles), [original])
+        self.assertEqual(list(other_req.source_articles), [])
+        self.client.login(username='rama_tester', password='password123')
+        self.assertIn(b"Desalination", self.client.get(reverse('export_research_csv', args=[repeat.id])).content)
+        self.assertEqual(ResearchRequest.publish_status(repeat.id)['body'].count('"product_count": 1'), 1)
+
+    @override_settings(SOURCE_CACHE_TTL_S=0)
+    def test_12_source_misses_expire_for_other_processes(self):
+        """TEST CASE 12: A source added where this process's cache isn't told is found once the TTL runs out"""
+        self.assertIsNone(ScrapeSource.for_url("example.com"))
+        ScrapeSource.objects.bulk_create([ScrapeSource(name="Example", base_url="https://example.com/", domain="example.com")])
+        self.assertEqual(ScrapeSource.for_url("https://www.example.com/news/1").name, "Example")
+
+    @override_settings(SCRAPE_DOMAIN_CONCURRENCY=1, SCRAPE_DOMAIN_SLOT_WAIT_S=300)
+    def test_13_busy_site_is_retried_without_waiting(self):
+        """TEST CASE 13: A run on a site with no free slot is deferred at once, not failed or left polling"""
+        throttle.reset()
+        self.addCleanup(throttle.reset)
+        with throttle.get_governor().slot(self.req.target_url), \
+                patch('archive_etl.tasks.init_driver') as init_driver, \
+                patch('core.throttle.time.sleep') as sleep, \
+                patch.object(run_research_pipeline, 'retry', side_effect=Retry()) as retry:
+            result = run_research_pipeline.apply(args=[self.req.id])
+        self.assertEqual(result.state, 'RETRY')
+        self.assertEqual(retry.call_args.kwargs['countdown'], 120)
+        init_driver.assert_not_called()
+        sleep.assert_not_called()
+        self.req.refresh_from_db()
+        self.assertEqual(self.req.status, ResearchRequest.Status.PENDING)
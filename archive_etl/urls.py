@@ -6,4 +6,6 @@ urlpatterns = [
     path('request/<int:pk>/', views.request_detail, name='request_detail'),
     path('request/<int:pk>/csv/', views.export_research_csv, name='export_research_csv'),
     path('status/<int:batch_id>/', views.batch_status, name='batch_status'),
+    path('search/', views.article_search, name='article_search'),
+    path('api/search/', views.article_search_api, name='article_search_api'),
 ]
\ No newline at end of file
@@ -6,6 +6,10 @@ import markdown
 from .models import ResearchRequest
 from .forms import ResearchForm
 from .tasks import run_research_pipeline
+from .search import search_articles
+from webscraper.status import status_response
+
+SEARCH_PAGE_SIZE = 50
 
 @login_required
 def research_dashboard(request):
@@ -65,7 +69,7 @@ def export_research_csv(request, pk):
     Downloads the scraped research data as a CSV file.
     """
     req = get_object_or_404(ResearchRequest, pk=pk, user=request.user)
-    articles = req.articles.all()
+    articles = req.source_articles.select_related('source')
     
     response = HttpResponse(content_type='text/csv')
     response['Content-Disposition'] = f'attachment; filename="research_{pk}.csv"'
@@ -84,20 +88,58 @@ def export_research_csv(request, pk):
         
     return response
 
+async def batch_status(request, batch_id):
+    """
+    Returns the real-time status of a research request for the dashboard polling,
+    from the cache entry the pipeline publishes (ETag/304, ?wait=N long-poll;
+    login is checked by status_response).
+    """
+    return await status_response(request, 'research', batch_id, ResearchRequest.publish_status)
+
+def _run_search(request):
+    query = request.GET.get('q', '').strip()
+    language = request.GET.get('lang', '').strip() or None
+    try:
+        limit = max(1, min(int(request.GET.get('limit', SEARCH_PAGE_SIZE)), 200))
+    except (ValueError, TypeError):
+        limit = SEARCH_PAGE_SIZE
+    results = search_articles(query, user=request.user, language=language, limit=limit) if query else []
+    return query, language, results
+
 @login_required
-def batch_status(request, batch_id):
+def article_search(request):
     """
-    Returns the real-time status of a research request for the dashboard polling.
+    Full-text search page over the user's archived articles.
     """
-    req = get_object_or_404(ResearchRequest, pk=batch_id, user=request.user)
-    
+    query, language, results = _run_search(request)
+    return render(request, 'archive_etl/search.html', {
+        'query': query,
+        'language': language or '',
+        'results': results,
+    })
+
+@login_required
+def article_search_api(request):
+    """
+    JSON variant of the article search: ?q=<terms>&lang=<en|ar>&limit=<n>
+    Append '*' to a term for a prefix match (e.g. 'econom*').
+    """
+    query, language, results = _run_search(request)
     return JsonResponse({
-        "product_count": req.articles.count(), 
-        "jobs": [
+        "query": query,
+        "language": language,
+        "count": len(results),
+        "results": [
             {
-                "status": req.status,
-                #'query' to 'topic' (or whatever you named the field)
-                "query": req.topic if hasattr(req, 'topic') else "Research Task"
+                "id": art.id,
+                "title": art.title,
+                "url": art.url,
+                "source": art.source.name if art.source else None,
+                "language": art.source.language_code if art.source else None,
+                "pub_date": art.pub_date.isoformat() if art.pub_date else None,
+                "rank": art.rank,
+                "excerpt": art.clean_text[:300],
             }
+            for art in results
         ]
-    })
\ No newline at end of file
+    })
@@ -1,28 +1,17 @@
 import logging
-import os
 from django.conf import settings
-from google import genai
 from google.genai import types
+from webscraper import llm
 
 logger = logging.getLogger(__name__)
 
-def _init_client():
-    """Initialize Google GenAI client using the dedicated Chatbot key."""
-    # Prioritize CHATBOT_API_KEY for isolated quota management
-    api_key = getattr(settings, 'CHATBOT_API_KEY', getattr(settings, 'CHATBOT_API_KEY', None))
-    
-    if not api_key:
-        logger.warning("No API key configured for Basira AI")
-        return None
-    try:
-        return genai.Client(api_key=api_key)
-    except Exception as e:
-        logger.error(f"Failed to initialize GenAI client: {e}")
-        return None
-
 def get_chat_response(session, user_message):
-    client = _init_client()
-    if not client:
+    # Use the dedicated Chatbot key for isolated quota management
+    api_key = getattr(settings, 'CHATBOT_API_KEY', None)
+    try:
+        llm.check_available(api_key)
+    except llm.LLMUnavailable as e:
+        logger.warning(f"No GenAI client for Basira AI: {e}")
         return "GenAI client not available."
 
     # We define the persona and the instructions to prioritize tools.
@@ -66,18 +55,20 @@ def get_chat_response(session, user_message):
 
     try:
         # --- GENERATE GROUNDED CONTENT ---
-        response = client.models.generate_content(
-            model="gemini-2.5-flash", 
-            contents=history,
+        text, _ = llm.generate(
+            history,
+            model="gemini-2.5-flash",
             config=types.GenerateContentConfig(
                 system_instruction={'parts': [{'text': system_text}]},
                 tools=tools, # This is the "Reading" engine
                 temperature=0.2, # Lower temperature ensures higher factual accuracy
                 max_output_tokens=1000,
-            )
+            ),
+            api_key=api_key,
+            purpose="chat",
         )
         
-        return response.text if response.text else "I couldn't find specific data in your documents to answer this."
+        return text if text else "I couldn't find specific data in your documents to answer this."
         
     except Exception as e:
         logger.error(f"Basira Insights Error: {e}")
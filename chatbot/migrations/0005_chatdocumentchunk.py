@@ -0,0 +1,28 @@
+# Generated by Django 5.0 on 2026-10-19 14:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0004_remove_chatsession_context_type_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatDocumentChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('text', models.TextField()),
+                ('token_count', models.PositiveIntegerField(default=0)),
+                ('term_freqs', models.JSONField(default=dict)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='chatbot.chatdocument')),
+            ],
+            options={
+                'ordering': ('document', 'position'),
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.0 on 2026-10-19 14:45
+
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    # Documents uploaded before background ingestion were extracted in the request
+    ChatDocument = apps.get_model('chatbot', 'ChatDocument')
+    ChatDocument.objects.update(status='READY')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0005_chatdocumentchunk'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='chatdocumentchunk',
+            options={'ordering': ('document', 'page', 'position')},
+        ),
+        migrations.AddField(
+            model_name='chatdocument',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='chatdocument',
+            name='file',
+            field=models.FileField(blank=True, null=True, upload_to='chat_uploads/%Y/%m/'),
+        ),
+        migrations.AddField(
+            model_name='chatdocument',
+            name='page_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chatdocument',
+            name='pages_done',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chatdocument',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('READY', 'Ready'), ('FAILED', 'Failed')], default='PENDING', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='chatdocumentchunk',
+            name='page',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+    ]
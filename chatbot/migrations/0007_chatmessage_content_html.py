@@ -0,0 +1,42 @@
+# Generated by Django 5.0 on 2026-10-19 02:58
+
+import re
+
+import markdown
+from django.db import migrations, models
+
+
+def clean_markdown(text):
+    # Frozen copy of chatbot.rendering.clean_markdown at the time of this migration
+    text = re.sub(r'(?<!\n)\n(\*|-)\s', r'\n\n\1 ', text or "")
+    return markdown.markdown(text, extensions=['extra', 'nl2br', 'codehilite'])
+
+
+def render_existing(apps, schema_editor):
+    # Historical models skip ChatMessage.save(), so render stored replies here
+    ChatMessage = apps.get_model('chatbot', 'ChatMessage')
+    batch = []
+    for message in ChatMessage.objects.filter(role='model').only('id', 'content').iterator(chunk_size=500):
+        message.content_html = clean_markdown(message.content)
+        batch.append(message)
+        if len(batch) >= 500:
+            ChatMessage.objects.bulk_update(batch, ['content_html'])
+            batch = []
+    if batch:
+        ChatMessage.objects.bulk_update(batch, ['content_html'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0006_chatdocument_ingestion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='content_html',
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(render_existing, migrations.RunPython.noop),
+    ]
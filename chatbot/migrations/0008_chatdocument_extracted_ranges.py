@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-19 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0007_chatmessage_content_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatdocument',
+            name='extracted_ranges',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
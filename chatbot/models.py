@@ -1,6 +1,8 @@
 from django.db import models
 from django.conf import settings
 
+from .rendering import clean_markdown
+
 class ChatSession(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     title = models.CharField(max_length=255, default="New Chat")
@@ -13,11 +15,45 @@ class ChatMessage(models.Model):
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages')
     role = models.CharField(max_length=10, choices=[('user', 'User'), ('model', 'AI')])
     content = models.TextField()
+    # Rendered once at write time so opening a long session does not re-run Markdown
+    content_html = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        if self.role == 'model' and not self.content_html:
+            self.content_html = clean_markdown(self.content)
+        super().save(*args, **kwargs)
+
 class ChatDocument(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        PROCESSING = 'PROCESSING', 'Processing'
+        READY = 'READY', 'Ready'
+        FAILED = 'FAILED', 'Failed'
+
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='documents')
     file_name = models.CharField(max_length=255)
+    file = models.FileField(upload_to='chat_uploads/%Y/%m/', blank=True, null=True)
     content = models.TextField(blank=True, null=True) # Extracted text
     gemini_file_id = models.CharField(max_length=255)
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Background ingestion progress (see chatbot.tasks)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    page_count = models.PositiveIntegerField(default=0)
+    pages_done = models.PositiveIntegerField(default=0)
+    # [start, end) page ranges already indexed, so a redelivered task is not counted twice
+    extracted_ranges = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+
+class ChatDocumentChunk(models.Model):
+    """ A retrieval unit of a ChatDocument, with its term frequencies for BM25. """
+    document = models.ForeignKey(ChatDocument, on_delete=models.CASCADE, related_name='chunks')
+    page = models.PositiveIntegerField(default=1)
+    position = models.PositiveIntegerField()
+    text = models.TextField()
+    token_count = models.PositiveIntegerField(default=0)
+    term_freqs = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ('document', 'page', 'position')
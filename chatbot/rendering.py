@@ -0,0 +1,13 @@
+import re
+import markdown
+
+def clean_markdown(text):
+    """
+    1. Pre-processes text to ensure lists render correctly by adding a blank line before asterisks.
+    2. Converts Markdown syntax into safe HTML tags.
+    """
+    # Fix 'tight list' issue: Add double newline before bullet points if missing
+    text = re.sub(r'(?<!\n)\n(\*|-)\s', r'\n\n\1 ', text or "")
+    
+    # Convert using standard extensions for tables, code blocks, and extra spacing
+    return markdown.markdown(text, extensions=['extra', 'nl2br', 'codehilite'])
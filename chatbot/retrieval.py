@@ -0,0 +1,160 @@
+import logging
+import math
+import re
+from collections import Counter, OrderedDict
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import ChatDocument, ChatDocumentChunk
+
+logger = logging.getLogger(__name__)
+
+# Chunking: word windows with a small overlap so answers spanning a boundary survive
+CHUNK_WORDS = 250
+CHUNK_OVERLAP = 40
+CHARS_PER_TOKEN = 4
+
+# BM25 parameters (standard Okapi defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Number of per-session indexes kept in memory per process
+INDEX_CACHE_SIZE = 64
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how i in is it its of on or that the their this to
+was were what when where which who why will with you your
+""".split())
+
+def tokenize(text):
+    return [w for w in _WORD_RE.findall((text or "").lower()) if w not in _STOPWORDS]
+
+def estimate_tokens(text):
+    return max(1, len(text or "") // CHARS_PER_TOKEN)
+
+def chunk_text(text, chunk_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Splits text into overlapping windows of roughly chunk_words words."""
+    words = (text or "").split()
+    if not words:
+        return []
+    step = max(1, chunk_words - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+def make_chunks(document, text, page=1):
+    """Builds unsaved ChatDocumentChunk rows (with term frequencies) for one span of text."""
+    return [
+        ChatDocumentChunk(
+            document=document,
+            page=page,
+            position=i,
+            text=chunk,
+            token_count=estimate_tokens(chunk),
+            term_freqs=dict(Counter(tokenize(chunk))),
+        )
+        for i, chunk in enumerate(chunk_text(text))
+    ]
+
+def index_document(document):
+    """
+    Splits a document's extracted content into chunks and stores them.
+    Retrieval never re-reads the full content afterwards.
+    """
+    ChatDocumentChunk.objects.filter(document=document).delete()
+    chunks = make_chunks(document, document.content)
+    ChatDocumentChunk.objects.bulk_create(chunks, batch_size=500)
+    _INDEX_CACHE.clear()
+    logger.info(f"Indexed document {document.id} ({document.file_name}) into {len(chunks)} chunks.")
+    return len(chunks)
+
+class BM25Index:
+    """In-memory Okapi BM25 over the chunks of one chat session."""
+
+    def __init__(self, chunks):
+        # chunks: iterable of (chunk_id, file_name, page, text, token_count, term_freqs)
+        self.chunks = list(chunks)
+        self.doc_freq = Counter()
+        for chunk in self.chunks:
+            self.doc_freq.update(chunk[5].keys())
+        self.lengths = [sum(chunk[5].values()) for chunk in self.chunks]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def _idf(self, term):
+        n = len(self.chunks)
+        df = self.doc_freq.get(term, 0)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query, k):
+        """Returns up to k (score, chunk) pairs, best first."""
+        terms = [t for t in set(tokenize(query)) if t in self.doc_freq]
+        if not terms or not self.chunks:
+            return []
+        idf = {t: self._idf(t) for t in terms}
+        scored = []
+        for chunk, length in zip(self.chunks, self.lengths):
+            tf = chunk[5]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / (self.avg_length or 1))
+            score = 0.0
+            for term in terms:
+                f = tf.get(term)
+                if f:
+                    score += idf[term] * f * (BM25_K1 + 1) / (f + norm)
+            if score > 0:
+                scored.append((score, chunk))
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return scored[:k]
+
+# session_id -> (signature, BM25Index); cleared whenever a document is indexed
+_INDEX_CACHE = OrderedDict()
+
+def get_session_index(session):
+    """
+    Returns the BM25 index for a session, building it from stored chunks.
+    Documents uploaded before chunking existed are indexed on first use.
+    """
+    for doc in ChatDocument.objects.filter(session=session, chunks__isnull=True).exclude(content__isnull=True).exclude(content=""):
+        index_document(doc)
+
+    chunks = ChatDocumentChunk.objects.filter(document__session=session)
+    # Chunk count + newest id changes whenever a document is added or deleted
+    signature = tuple(chunks.aggregate(n=Count('id'), last=Max('id')).values())
+    cached = _INDEX_CACHE.get(session.id)
+    if cached and cached[0] == signature:
+        _INDEX_CACHE.move_to_end(session.id)
+        return cached[1]
+
+    index = BM25Index(chunks.values_list(
+        'id', 'document__file_name', 'page', 'text', 'token_count', 'term_freqs'
+    ).order_by('document', 'page', 'position'))
+    _INDEX_CACHE[session.id] = (signature, index)
+    if len(_INDEX_CACHE) > INDEX_CACHE_SIZE:
+        _INDEX_CACHE.popitem(last=False)
+    return index
+
+def build_context(session, query, token_budget=None, top_k=None):
+    """
+    Picks the chunks most relevant to the query and concatenates them,
+    labelled with their source file, without exceeding token_budget.
+    Generic questions that match nothing ("summarize this") fall back to the
+    opening chunks of each document.
+    """
+    token_budget = token_budget or getattr(settings, 'CHATBOT_CONTEXT_TOKENS', 3000)
+    top_k = top_k or getattr(settings, 'CHATBOT_CONTEXT_TOP_K', 8)
+
+    index = get_session_index(session)
+    selected = [chunk for _, chunk in index.search(query, top_k)]
+    if not selected:
+        selected = sorted(index.chunks, key=lambda chunk: chunk[2])[:top_k]
+
+    parts, used = [], 0
+    for chunk_id, file_name, page, text, token_count, _ in selected:
+        if used + token_count > token_budget:
+            continue
+        parts.append(f"[{file_name} - p. {page}]\n{text}")
+        used += token_count
+    return "\n\n".join(parts)
@@ -0,0 +1,81 @@
+import logging
+from celery import group
+from django.conf import settings
+from django.db import transaction
+from PyPDF2 import PdfReader
+from webscraper.celery import app
+
+from .models import ChatDocument, ChatDocumentChunk
+from .retrieval import make_chunks
+
+logger = logging.getLogger(__name__)
+
+@app.task(bind=True)
+def process_chat_document(self, doc_id: int):
+    """
+    Entry point for an uploaded PDF: counts pages, then fans the extraction
+    out over page ranges so large documents are processed by several workers.
+    """
+    doc = ChatDocument.objects.get(id=doc_id)
+    try:
+        reader = PdfReader(doc.file.path)
+        page_count = len(reader.pages)
+    except Exception as e:
+        logger.error(f"Document {doc_id} could not be opened: {e}")
+        ChatDocument.objects.filter(id=doc_id).update(status=ChatDocument.Status.FAILED, error=str(e)[:500])
+        return {'status': 'failed', 'doc_id': doc_id}
+
+    ChatDocumentChunk.objects.filter(document_id=doc_id).delete()
+    ChatDocument.objects.filter(id=doc_id).update(
+        status=ChatDocument.Status.PROCESSING, page_count=page_count, pages_done=0, extracted_ranges=[], error=""
+    )
+    if page_count == 0:
+        ChatDocument.objects.filter(id=doc_id).update(status=ChatDocument.Status.READY)
+        return {'status': 'ready', 'doc_id': doc_id, 'pages': 0}
+
+    pages_per_task = max(1, getattr(settings, 'CHATBOT_PDF_PAGES_PER_TASK', 25))
+    ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+
+    if len(ranges) == 1:
+        # Small documents: no point paying the queue round-trip
+        extract_pdf_pages(doc_id, 0, page_count)
+    else:
+        group(extract_pdf_pages.s(doc_id, start, end) for start, end in ranges).apply_async()
+
+    logger.info(f"Document {doc_id}: {page_count} pages in {len(ranges)} extraction tasks.")
+    return {'status': 'queued', 'doc_id': doc_id, 'pages': page_count, 'tasks': len(ranges)}
+
+@app.task
+def extract_pdf_pages(doc_id: int, start: int, end: int):
+    """
+    Extracts and indexes pages [start, end) of a document. The last range to
+    finish flips the document to READY. Safe to run twice for a range (tasks
+    are acked late, so a lost worker's range is redelivered): its chunks are
+    replaced and its pages counted once.
+    """
+    doc = ChatDocument.objects.get(id=doc_id)
+    if [start, end] in doc.extracted_ranges:
+        return {'status': 'skipped', 'doc_id': doc_id, 'pages': [start, end]}
+    try:
+        reader = PdfReader(doc.file.path)
+        chunks = []
+        for page_no in range(start, end):
+            text = reader.pages[page_no].extract_text() or ""
+            chunks.extend(make_chunks(doc, text, page=page_no + 1))
+    except Exception as e:
+        logger.error(f"Document {doc_id} pages {start}-{end} failed: {e}")
+        ChatDocument.objects.filter(id=doc_id).update(status=ChatDocument.Status.FAILED, error=str(e)[:500])
+        return {'status': 'failed', 'doc_id': doc_id, 'pages': [start, end]}
+
+    with transaction.atomic():
+        doc = ChatDocument.objects.select_for_update().get(id=doc_id)
+        if [start, end] in doc.extracted_ranges:
+            return {'status': 'skipped', 'doc_id': doc_id, 'pages': [start, end]}
+        ChatDocumentChunk.objects.filter(document_id=doc_id, page__gt=start, page__lte=end).delete()
+        ChatDocumentChunk.objects.bulk_create(chunks, batch_size=500)
+        doc.extracted_ranges.append([start, end])
+        doc.pages_done = sum(range_end - range_start for range_start, range_end in doc.extracted_ranges)
+        if doc.status == ChatDocument.Status.PROCESSING and doc.pages_done >= doc.page_count:
+            doc.status = ChatDocument.Status.READY
+        doc.save(update_fields=['extracted_ranges', 'pages_done', 'status'])
+    return {'status': 'success', 'doc_id': doc_id, 'pages': [start, end], 'chunks': len(chunks)}
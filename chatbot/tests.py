@@ -1,3 +1,201 @@
-from django.test import TestCase
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from webscraper.celery import app as celery_app
+from chatbot.models import ChatSession, ChatMessage, ChatDocument, ChatDocumentChunk
+from chatbot.retrieval import build_context, chunk_text, index_document
+from chatbot.tasks import extract_pdf_pages, process_chat_document
 
-# Create your tests here.
+class ChatRetrievalTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='malek_tester', password='password123')
+        self.session = ChatSession.objects.create(user=self.user, title="Market study")
+
+    def _upload(self, name, text):
+        doc = ChatDocument.objects.create(session=self.session, file_name=name, content=text)
+        index_document(doc)
+        return doc
+
+    def test_01_chunking_overlaps(self):
+        """TEST CASE 1: Long text is split into overlapping word windows"""
+        words = [f"w{i}" for i in range(600)]
+        chunks = chunk_text(" ".join(words), chunk_words=250, overlap=40)
+        self.assertEqual(len(chunks), 3)
+        self.assertTrue(chunks[1].startswith("w210 "))
+        self.assertTrue(chunks[-1].endswith("w599"))
+
+    def test_02_retrieves_relevant_chunks_within_budget(self):
+        """TEST CASE 2: Only chunks relevant to the message are sent, under the token budget"""
+        filler = " ".join(["market research segmentation"] * 300)
+        self._upload("students.pdf", filler + " Student motivation in Jordan rose with online learning adoption. " + filler)
+        self._upload("retail.pdf", " ".join(["retail pricing competition"] * 300))
+        self.assertGreater(ChatDocumentChunk.objects.count(), 4)
+
+        context = build_context(self.session, "What drives student motivation?", token_budget=1200)
+        self.assertIn("Student motivation in Jordan", context)
+        self.assertIn("[students.pdf", context)
+        self.assertNotIn("retail.pdf", context)
+        self.assertLessEqual(len(context) // 4, 1200)
+
+    def test_03_indexes_legacy_documents_lazily(self):
+        """TEST CASE 3: Documents stored before chunking existed are indexed on first message"""
+        ChatDocument.objects.create(session=self.session, file_name="old.pdf", content="Pricing strategy for Amman retailers.")
+        context = build_context(self.session, "pricing strategy")
+        self.assertIn("Pricing strategy for Amman retailers.", context)
+
+
+def _make_pdf(pages):
+    """Builds a minimal text PDF, one string per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out, offsets = "%PDF-1.4\n", []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{body}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{off:010d} 00000 n \n" for off in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF"
+    return out.encode("latin-1")
+
+
+class ChatIngestionTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.user = User.objects.create_user(username='firas_tester', password='password123')
+        self.client.login(username='firas_tester', password='password123')
+
+    def test_01_upload_returns_immediately_and_queues_ingestion(self):
+        """TEST CASE 1: Upload stores the file and defers extraction to Celery"""
+        pdf = SimpleUploadedFile("report.pdf", _make_pdf(["Hello"]), content_type="application/pdf")
+        with override_settings(MEDIA_ROOT=self.media.name), patch('chatbot.views.process_chat_document.delay') as delay:
+            data = self.client.post(reverse('upload_document'), {'file': pdf, 'session_id': ''}).json()
+
+        doc = ChatDocument.objects.get(id=data['document_id'])
+        delay.assert_called_once_with(doc.id)
+        self.assertEqual(doc.status, ChatDocument.Status.PENDING)
+        self.assertTrue(doc.file.name.endswith(".pdf"))
+        status = self.client.get(reverse('document_status', args=[doc.id])).json()
+        self.assertEqual(status['status'], 'PENDING')
+
+    def test_02_page_ranges_are_extracted_and_indexed(self):
+        """TEST CASE 2: Page ranges are extracted in parallel tasks and the document becomes READY"""
+        session = ChatSession.objects.create(user=self.user)
+        pages = ["Intro to the study", "Student motivation survey results", "Appendix tables"]
+        with override_settings(MEDIA_ROOT=self.media.name, CHATBOT_PDF_PAGES_PER_TASK=1):
+            doc = ChatDocument.objects.create(session=session, file_name="study.pdf",
+                                              file=SimpleUploadedFile("study.pdf", _make_pdf(pages)))
+            celery_app.conf.task_always_eager = True
+            self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+            result = process_chat_document(doc.id)
+
+        doc.refresh_from_db()
+        self.assertEqual(result['tasks'], 3)
+        self.assertEqual(doc.status, ChatDocument.Status.READY)
+        self.assertEqual((doc.pages_done, doc.page_count), (3, 3))
+        self.assertIn("[study.pdf - p. 2]", build_context(session, "motivation survey"))
+
+    def test_03_redelivered_range_is_indexed_once(self):
+        """TEST CASE 3: Running a page range twice neither duplicates chunks nor counts its pages twice"""
+        session = ChatSession.objects.create(user=self.user)
+        pages = ["Intro to the study", "Student motivation survey results", "Appendix tables"]
+        with override_settings(MEDIA_ROOT=self.media.name, CHATBOT_PDF_PAGES_PER_TASK=1), \
+                patch('chatbot.tasks.group'):
+            doc = ChatDocument.objects.create(session=session, file_name="study.pdf",
+                                              file=SimpleUploadedFile("study.pdf", _make_pdf(pages)))
+            process_chat_document(doc.id)
+            extract_pdf_pages(doc.id, 0, 1)
+            chunks = ChatDocumentChunk.objects.filter(document=doc).count()
+            self.assertEqual(extract_pdf_pages(doc.id, 0, 1)['status'], 'skipped')
+            ChatDocument.objects.filter(id=doc.id).update(extracted_ranges=[])
+            extract_pdf_pages(doc.id, 0, 1)
+
+            doc.refresh_from_db()
+            self.assertEqual(ChatDocumentChunk.objects.filter(document=doc).count(), chunks)
+            self.assertEqual(doc.pages_done, 1)
+            self.assertEqual(doc.status, ChatDocument.Status.PROCESSING)
+
+            extract_pdf_pages(doc.id, 1, 2)
+            extract_pdf_pages(doc.id, 2, 3)
+        doc.refresh_from_db()
+        self.assertEqual((doc.pages_done, doc.status), (3, ChatDocument.Status.READY))
+
+
+class ChatStreamingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='rama_tester', password='password123')
+        self.client.login(username='rama_tester', password='password123')
+
+    def test_01_stream_forwards_deltas_and_persists_reply(self):
+        """TEST CASE 1: Tokens are streamed as SSE events and the full reply is saved at the end"""
+        fake_client = SimpleNamespace(models=SimpleNamespace(generate_content_stream=lambda **kwargs: iter(
+            [SimpleNamespace(text="**Segment** "), SimpleNamespace(text="by region.")]
+        )))
+        with patch('webscraper.llm.get_client', return_value=fake_client):
+            response = self.client.post(reverse('stream_message'), {'message': 'How to segment?', 'session_id': ''})
+            body = b"".join(response.streaming_content).decode()
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(body.count("event: delta"), 2)
+        self.assertIn("event: done", body)
+        self.assertIn("<strong>Segment</strong>", body)
+        reply = ChatMessage.objects.get(role='model')
+        self.assertEqual(reply.content, "**Segment** by region.")
+
+    def test_02_history_uses_stored_html_and_paginates(self):
+        """TEST CASE 2: Replies are rendered once on save and old history loads page by page"""
+        session = ChatSession.objects.create(user=self.user)
+        for i in range(5):
+            ChatMessage.objects.create(session=session, role='user', content=f"question {i}")
+            ChatMessage.objects.create(session=session, role='model', content=f"**answer {i}**")
+        self.assertEqual(ChatMessage.objects.filter(role='model').first().content_html, "<p><strong>answer 0</strong></p>")
+
+        url = reverse('chat_interface_detail', args=[session.id])
+        with override_settings(CHATBOT_HISTORY_PAGE_SIZE=4), patch('chatbot.models.clean_markdown') as render:
+            page = self.client.get(url)
+            older = self.client.get(url, {'before': page.context['chat_log'][0].id})
+
+        render.assert_not_called()
+        self.assertEqual([m.content for m in page.context['chat_log']][-1], "**answer 4**")
+        self.assertEqual(len(page.context['chat_log']), 4)
+        self.assertTrue(page.context['has_earlier'])
+        self.assertContains(page, "<strong>answer 4</strong>")
+        self.assertEqual(older.context['chat_log'][-1].content, "**answer 2**")
+        self.assertTrue(older.context['has_earlier'])
+
+    async def test_03_stream_is_not_buffered_under_asgi(self):
+        """TEST CASE 3: Under ASGI each delta reaches the client before the next one is generated"""
+        generated = []
+
+        def fake_stream(**kwargs):
+            for text in ["First ", "second."]:
+                generated.append(text)
+                yield SimpleNamespace(text=text)
+
+        await self.async_client.aforce_login(self.user)
+        fake_client = SimpleNamespace(models=SimpleNamespace(generate_content_stream=fake_stream))
+        received = []
+        with patch('webscraper.llm.get_client', return_value=fake_client):
+            response = await self.async_client.post(reverse('stream_message'), {'message': 'Hi', 'session_id': ''})
+            async for chunk in response.streaming_content:
+                received.append((chunk.decode(), list(generated)))
+
+        self.assertTrue(response.is_async)
+        deltas = [seen for chunk, seen in received if chunk.startswith("event: delta")]
+        self.assertEqual(deltas, [["First "], ["First ", "second."]])
+        self.assertTrue(received[-1][0].startswith("event: done"))
+        reply = await ChatMessage.objects.aget(role='model')
+        self.assertEqual(reply.content, "First second.")
@@ -5,7 +5,9 @@ urlpatterns = [
     path('', views.chat_interface, name='chat_home'),
     path('<int:session_id>/', views.chat_interface, name='chat_interface_detail'),
     path('send/', views.send_message, name='send_message'),
+    path('stream/', views.stream_message, name='stream_message'),
     path('upload/', views.upload_document, name='upload_document'),
+    path('document/<int:doc_id>/status/', views.document_status, name='document_status'),
     path('delete-chat/<int:session_id>/', views.delete_chat_session, name='delete_chat'),
     path('delete-document/<int:doc_id>/', views.delete_document, name='delete_document'),
 ]
\ No newline at end of file
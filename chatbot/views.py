@@ -1,26 +1,17 @@
-import json, re
-import google.generativeai as genai
-import markdown
+import json
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from .models import ChatSession, ChatMessage, ChatDocument
-from PyPDF2 import PdfReader # pip install PyPDF2
+from .retrieval import build_context
+from .tasks import process_chat_document
+from webscraper import llm
 
-genai.configure(api_key=settings.CHATBOT_API_KEY)
-
-def clean_markdown(text):
-    """
-    1. Pre-processes text to ensure lists render correctly by adding a blank line before asterisks.
-    2. Converts Markdown syntax into safe HTML tags.
-    """
-    # Fix 'tight list' issue: Add double newline before bullet points if missing
-    text = re.sub(r'(?<!\n)\n(\*|-)\s', r'\n\n\1 ', text)
-    
-    # Convert using standard extensions for tables, code blocks, and extra spacing
-    return markdown.markdown(text, extensions=['extra', 'nl2br', 'codehilite'])
+CHAT_MODEL = "gemini-2.5-flash"
 
 @login_required
 def chat_interface(request, session_id=None):
@@ -29,22 +20,72 @@ def chat_interface(request, session_id=None):
     chat_log = [] 
     documents = []
     
+    has_earlier = False
+    
     if session_id:
         current_session = get_object_or_404(ChatSession, id=session_id, user=request.user)
-        # Fetch only the messages for this session
-        chat_log = current_session.messages.all().order_by('created_at')
-        for msg in chat_log:
-            if msg.role == 'model':
-                msg.content = clean_markdown(msg.content)
+        # Only the newest page of messages; older ones load via ?before=<message id>
+        page_size = getattr(settings, 'CHATBOT_HISTORY_PAGE_SIZE', 50)
+        messages = current_session.messages.order_by('-id')
+        before = request.GET.get('before')
+        if before and before.isdigit():
+            messages = messages.filter(id__lt=int(before))
+        chat_log = list(messages[:page_size + 1])
+        has_earlier = len(chat_log) > page_size
+        chat_log = chat_log[:page_size][::-1]
         documents = current_session.documents.all().order_by('-created_at')
 
     return render(request, 'chatbot/room.html', {
         'sessions': sessions,
         'current_session': current_session,
         'chat_log': chat_log, 
+        'has_earlier': has_earlier,
         'documents': documents
     })
 
+SYSTEM_INSTRUCTION = (
+    "You are Basira AI, a senior Marketing Strategist and Digital Transformation Expert "
+    "specializing in the Middle Eastern market. Your mission is to assist marketing companies "
+    "and research firms in streamlining their research through AI-driven insights and automation. "
+    
+    "Key Areas of Expertise: "
+    "1. Market Research: Analyze the provided document context to identify consumer behavior patterns, "
+    "specifically focusing on student motivation and online learning trends in the MENA region. "
+    "2. Strategic Frameworks: Help users develop marketing strategies using frameworks like "
+    "STP (Segmentation, Targeting, Positioning), SWOT, and Customer Journey Maps. "
+    "3. Process Optimization: Offer guidance on using web scraping and data extraction to "
+    "automate competitive analysis and market mapping. "
+
+    "Response Guidelines: "
+    "- Always prioritize the provided 'Document Context' for specific data points. "
+    "- Maintain a professional, insightful, and strategic tone. "
+    "- Ground creative marketing ideas in data-driven research. "
+)
+
+def _start_turn(request, user_text, session_id):
+    """
+    Resolves (or creates) the chat session, records the user's message and
+    builds the generation config with the document context relevant to this message.
+    """
+    # FIX: Handle empty session_id to prevent ValueError
+    if session_id and session_id.strip():
+        chat_session = get_object_or_404(ChatSession, id=session_id, user=request.user)
+    else:
+        # Create a new session if starting fresh
+        title = user_text[:30] + "..." if len(user_text) > 30 else user_text
+        chat_session = ChatSession.objects.create(user=request.user, title=title)
+
+    # Save the user's message to history
+    ChatMessage.objects.create(session=chat_session, role='user', content=user_text)
+
+    # 1. GATHER CONTEXT: Retrieve only the document chunks relevant to this message
+    context_text = build_context(chat_session, user_text)
+
+    # 2. CONSTRUCT PROMPT: Prioritize the extracted text
+    system_instruction = SYSTEM_INSTRUCTION + f"\n\nDocument Context:\n{context_text}"
+
+    return chat_session, {'system_instruction': system_instruction}
+
 @csrf_exempt
 @login_required
 def send_message(request):
@@ -60,56 +101,18 @@ def send_message(request):
             return JsonResponse({'error': 'Empty message'}, status=400)
 
         try:
-            # FIX: Handle empty session_id to prevent ValueError
-            if session_id and session_id.strip():
-                chat_session = get_object_or_404(ChatSession, id=session_id, user=request.user)
-            else:
-                # Create a new session if starting fresh
-                title = user_text[:30] + "..." if len(user_text) > 30 else user_text
-                chat_session = ChatSession.objects.create(user=request.user, title=title)
-
-            # Save the user's message to history
-            ChatMessage.objects.create(session=chat_session, role='user', content=user_text)
-
-            # 1. GATHER CONTEXT: Pull text from all PDFs linked to this session
-            docs = ChatDocument.objects.filter(session=chat_session)
-            context_text = "\n".join([d.content for d in docs if d.content])
-
-            # 2. CONSTRUCT PROMPT: Prioritize the extracted text
-            system_instruction = (
-                "You are Basira AI, a senior Marketing Strategist and Digital Transformation Expert "
-                "specializing in the Middle Eastern market. Your mission is to assist marketing companies "
-                "and research firms in streamlining their research through AI-driven insights and automation. "
-                
-                "Key Areas of Expertise: "
-                "1. Market Research: Analyze the provided document context to identify consumer behavior patterns, "
-                "specifically focusing on student motivation and online learning trends in the MENA region. "
-                "2. Strategic Frameworks: Help users develop marketing strategies using frameworks like "
-                "STP (Segmentation, Targeting, Positioning), SWOT, and Customer Journey Maps. "
-                "3. Process Optimization: Offer guidance on using web scraping and data extraction to "
-                "automate competitive analysis and market mapping. "
-
-                "Response Guidelines: "
-                "- Always prioritize the provided 'Document Context' for specific data points. "
-                "- Maintain a professional, insightful, and strategic tone. "
-                "- Ground creative marketing ideas in data-driven research. "
-                
-                f"\n\nDocument Context:\n{context_text}"
-                )
+            chat_session, config = _start_turn(request, user_text, session_id)
             
-            # Use gemini-2.5-flash for speed and context handling
-            model = genai.GenerativeModel("gemini-2.5-flash", system_instruction=system_instruction)
+            # 3. GENERATE RESPONSE: gemini-2.5-flash for speed and context handling
+            ai_text, _ = llm.generate(user_text, model=CHAT_MODEL, config=config,
+                                      api_key=settings.CHATBOT_API_KEY, purpose="chat")
             
-            # 3. GENERATE RESPONSE
-            response = model.generate_content(user_text)
-            ai_text = response.text
-            
-            # Save AI response to DB
-            ChatMessage.objects.create(session=chat_session, role='model', content=ai_text)
+            # Save AI response to DB (rendered to HTML once, on save)
+            message = ChatMessage.objects.create(session=chat_session, role='model', content=ai_text)
             
             # Return cleaned HTML for proper list/bold rendering
             return JsonResponse({
-                'response': clean_markdown(ai_text),
+                'response': message.content_html,
                 'session_id': chat_session.id
             })
 
@@ -118,6 +121,72 @@ def send_message(request):
 
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+_STREAM_END = object()
+
+async def _aiterate(iterator):
+    """
+    Async view of a blocking iterator: each item is pulled in a worker thread.
+    Under ASGI Django buffers a sync iterator whole, so streams go through here.
+    """
+    pull = sync_to_async(next)
+    try:
+        while (item := await pull(iterator, _STREAM_END)) is not _STREAM_END:
+            yield item
+    finally:
+        # Run the generator's cleanup (persisting the reply) even if the client went away
+        await sync_to_async(iterator.close)()
+
+@csrf_exempt
+@login_required
+def stream_message(request):
+    """
+    Server-sent events variant of send_message: forwards text deltas as
+    Gemini generates them, then sends the rendered HTML and persists the
+    model's message once the stream completes.
+    Events: 'session' -> 'delta'* -> 'done' (or 'error').
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+    user_text = request.POST.get('message')
+    session_id = request.POST.get('session_id')
+    if not user_text:
+        return JsonResponse({'error': 'Empty message'}, status=400)
+
+    try:
+        chat_session, config = _start_turn(request, user_text, session_id)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+    def event_stream():
+        yield _sse('session', {'session_id': chat_session.id})
+        parts, message = [], None
+        try:
+            for text in llm.generate_stream(user_text, model=CHAT_MODEL, config=config,
+                                            api_key=settings.CHATBOT_API_KEY, purpose="chat"):
+                parts.append(text)
+                yield _sse('delta', {'text': text})
+        except Exception as e:
+            yield _sse('error', {'error': str(e)})
+        finally:
+            # Persist whatever was generated, even if the client disconnected mid-stream
+            ai_text = "".join(parts)
+            if ai_text:
+                message = ChatMessage.objects.create(session=chat_session, role='model', content=ai_text)
+        if message:
+            yield _sse('done', {'html': message.content_html, 'session_id': chat_session.id})
+
+    stream = event_stream()
+    if isinstance(request, ASGIRequest):
+        stream = _aiterate(stream)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+    return response
+
 @csrf_exempt
 @login_required
 def upload_document(request):
@@ -135,27 +204,41 @@ def upload_document(request):
                     title=f"Doc: {uploaded_file.name[:20]}"
                 )
 
-            # Extract text using PyPDF2
-            reader = PdfReader(uploaded_file)
-            text = "".join([page.extract_text() for page in reader.pages])
-
-            # Save the document
+            # Store the file; text extraction and indexing run in a Celery task
             doc = ChatDocument.objects.create(
                 session=session, 
                 file_name=uploaded_file.name, 
-                content=text
+                file=uploaded_file,
+                status=ChatDocument.Status.PENDING
             )
+            process_chat_document.delay(doc.id)
             
             # Return the new session_id so the frontend can redirect
             return JsonResponse({
                 'status': 'success', 
-                'session_id': session.id
+                'session_id': session.id,
+                'document_id': doc.id,
+                'document_status': doc.status
             })
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
             
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
+@login_required
+def document_status(request, doc_id):
+    """
+    Ingestion progress of an uploaded document, polled by the chat sidebar.
+    """
+    doc = get_object_or_404(ChatDocument, id=doc_id, session__user=request.user)
+    return JsonResponse({
+        'id': doc.id,
+        'status': doc.status,
+        'page_count': doc.page_count,
+        'pages_done': doc.pages_done,
+        'error': doc.error,
+    })
+
 @csrf_exempt
 @login_required
 def delete_chat_session(request, session_id):
@@ -165,5 +248,8 @@ def delete_chat_session(request, session_id):
 @csrf_exempt
 @login_required
 def delete_document(request, doc_id):
-    get_object_or_404(ChatDocument, id=doc_id, session__user=request.user).delete()
+    doc = get_object_or_404(ChatDocument, id=doc_id, session__user=request.user)
+    if doc.file:
+        doc.file.delete(save=False)
+    doc.delete()
     return JsonResponse({'success': True})
\ No newline at end of file
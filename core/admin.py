@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ScrapeBatch, ScrapeJob, Product, BatchInsight
+from .models import ScrapeBatch, ScrapeJob, ScrapeSchedule, Product, BatchInsight, CanonicalProduct
 
 @admin.register(ScrapeBatch)
 class ScrapeBatchAdmin(admin.ModelAdmin):
@@ -13,11 +13,23 @@ class ScrapeJobAdmin(admin.ModelAdmin):
     list_display = ("id", "batch", "site", "status", "created_at")
     list_filter = ("site", "status", "created_at") 
 
+@admin.register(ScrapeSchedule)
+class ScrapeScheduleAdmin(admin.ModelAdmin):
+    list_display = ("id", "category_url", "user", "interval_hours", "enabled", "next_run_at", "last_run_at")
+    list_filter = ("enabled", "interval_hours")
+    exclude = ("snapshot",)
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ("id", "site", "title", "price", "currency", "rating", "scraped_at", "job_id")
+    list_display = ("id", "site", "title", "price", "currency", "rating", "change", "scraped_at", "job_id")
     search_fields = ("title", "product_url", "search_query")
-    list_filter = ("site", "currency", "scraped_at", "rating")
+    list_filter = ("site", "currency", "change", "scraped_at", "rating")
+
+@admin.register(CanonicalProduct)
+class CanonicalProductAdmin(admin.ModelAdmin):
+    list_display = ("id", "site", "title", "last_price", "currency", "first_seen_at", "last_seen_at")
+    search_fields = ("title", "url_key")
+    list_filter = ("site",)
 
 @admin.register(BatchInsight)
 class BatchInsightAdmin(admin.ModelAdmin):
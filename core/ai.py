@@ -1,54 +1,15 @@
 import logging
 import json
 from django.conf import settings
-
-# Use the new google.genai client
-genai_client = None
-
-try:
-    from google import genai as _genai_new
-except Exception:
-    _genai_new = None
+from webscraper import llm
 
 logger = logging.getLogger(__name__)
 
-def _init_client():
-    """Initialize Google GenAI client using the new library."""
-    global genai_client
-    api_key = getattr(settings, 'GOOGLE_API_KEY', None)
-    if not api_key:
-        return None
-    try:
-        if _genai_new:
-            genai_client = _genai_new.Client(api_key=api_key)
-            logger.info("google.genai client initialized.")
-        else:
-            logger.error("google-genai is not installed. Install it with `pip install google-genai`." )
-    except Exception as e:
-        logger.error(f"Failed to initialize GenAI client: {e}")
-        genai_client = None
-    return genai_client
-
 def _generate_summary(prompt: str, model: str) -> str:
-    """Generate content with the google.genai client."""
-    if genai_client is None:
-        _init_client()
-    if genai_client is None:
-        raise RuntimeError("GenAI client not initialized")
-
-    resp = genai_client.models.generate_content(model=model, contents=prompt)
-    try:
-        return resp.text.strip()
-    except Exception:
-        try:
-            parts = []
-            cand = resp.candidates[0]
-            for p in getattr(cand, 'content', {}).parts:
-                if getattr(p, 'text', None):
-                    parts.append(p.text)
-            return "\n".join(parts).strip() if parts else ""
-        except Exception:
-            return ""
+    """Generate content through the shared LLM client; identical stats reuse the cached summary."""
+    text, _ = llm.generate(prompt, model=model, api_key=getattr(settings, 'GOOGLE_API_KEY', None),
+                           purpose="summary", cache=True)
+    return text
 
 def _build_prompt(stats, query, sites):
     # Create a simple JSON of the stats to pass to the model
@@ -83,7 +44,12 @@ def _build_prompt(stats, query, sites):
             """ 
     return prompt
 
-def summarize_batch(stats, query, sites):
+def summarize_batch(stats, query, sites, raise_errors=False):
+    """
+    Short market summary of a batch's stats. Failures return a fallback
+    message unless raise_errors is set (callers that retry, e.g. the
+    summary task).
+    """
     if not stats or stats.get("count", 0) == 0:
         return "No products found to summarize."
 
@@ -95,4 +61,7 @@ def summarize_batch(stats, query, sites):
         summary_text = _generate_summary(prompt, model=model_name)
         return summary_text.replace("•", "-")
     except Exception as e:
-        return f"Summary generation failed, but {stats.get('count')} items were processed."
\ No newline at end of file
+        logger.error(f"Summary generation failed: {e}")
+        if raise_errors:
+            raise
+        return f"Summary generation failed, but {stats.get('count')} items were processed."
@@ -1,8 +1,15 @@
 import logging
-from django.db.models import Avg, Min, Max, Count, Sum
+from django.db import connections
+from django.db.models import Aggregate, Avg, FloatField, Min, Max, Count, Sum
 
 logger = logging.getLogger(__name__)
 
+class Median(Aggregate):
+    """Continuous median computed by the database (PostgreSQL's percentile_cont)."""
+    function = 'PERCENTILE_CONT'
+    template = '%(function)s(0.5) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
 def compute_batch_stats(product_queryset):
     try:
         count = product_queryset.count()
@@ -19,28 +26,33 @@ def compute_batch_stats(product_queryset):
         }
 
         if stats["has_price"]:
-            # Standard Aggregations
-            price_agg = products_with_price.aggregate(
-                avg=Avg('price'), min=Min('price'), max=Max('price')
-            )
+            # Standard Aggregations (plus the median where the database can compute it)
+            in_database = connections[products_with_price.db].vendor == 'postgresql'
+            aggregates = dict(avg=Avg('price'), min=Min('price'), max=Max('price'))
+            if in_database:
+                aggregates['median'] = Median('price')
+            price_agg = products_with_price.aggregate(**aggregates)
             stats.update({
                 "avg": round(float(price_agg['avg'] or 0), 2),
                 "min": round(float(price_agg['min'] or 0), 2),
                 "max": round(float(price_agg['max'] or 0), 2),
             })
 
-            # --- Manual Median Calculation ---
-            # Extract values, convert to float, and sort
-            prices = sorted([float(p) for p in products_with_price.values_list('price', flat=True)])
-            n = len(prices)
-            if n > 0:
-                mid = n // 2
-                if n % 2 == 0:
-                    # Even number of items: average of the two middle values
-                    stats['median'] = round((prices[mid - 1] + prices[mid]) / 2, 2)
-                else:
-                    # Odd number of items: the middle value
-                    stats['median'] = round(prices[mid], 2)
+            if in_database:
+                stats['median'] = round(float(price_agg['median'] or 0), 2)
+            else:
+                # --- Manual Median Calculation ---
+                # Extract values, convert to float, and sort
+                prices = sorted([float(p) for p in products_with_price.values_list('price', flat=True)])
+                n = len(prices)
+                if n > 0:
+                    mid = n // 2
+                    if n % 2 == 0:
+                        # Even number of items: average of the two middle values
+                        stats['median'] = round((prices[mid - 1] + prices[mid]) / 2, 2)
+                    else:
+                        # Odd number of items: the middle value
+                        stats['median'] = round(prices[mid], 2)
 
         # Site Counts
         site_counts = product_queryset.values('site').annotate(c=Count('id'))
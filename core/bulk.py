@@ -0,0 +1,31 @@
+import logging
+from django.db import connections, router
+
+logger = logging.getLogger(__name__)
+
+def bulk_insert(model, objs, batch_size=500):
+    """
+    Inserts unsaved model instances when their primary keys are not needed
+    afterwards. On PostgreSQL the rows are streamed with COPY ... FROM STDIN
+    (one statement, no per-row parsing or planning); other databases use
+    bulk_create. Field defaults and auto_now_add are applied the same way as
+    bulk_create. Returns the number of rows written.
+    """
+    objs = list(objs)
+    if not objs:
+        return 0
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor != 'postgresql':
+        model.objects.bulk_create(objs, batch_size=batch_size)
+        return len(objs)
+
+    # Columns the database fills itself (the serial primary key) are left out
+    fields = [f for f in model._meta.concrete_fields if not getattr(f, 'db_returning', False)]
+    columns = ", ".join(connection.ops.quote_name(f.column) for f in fields)
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        with cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+            for obj in objs:
+                copy.write_row([f.get_db_prep_save(f.pre_save(obj, True), connection) for f in fields])
+    logger.debug(f"COPY {len(objs)} rows into {model._meta.db_table}")
+    return len(objs)
@@ -0,0 +1,99 @@
+import logging
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from django.db import transaction
+from django.utils import timezone
+
+from .bulk import bulk_insert
+from .models import CanonicalProduct, PriceObservation
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that never identify a product (campaign and click tracking)
+TRACKING_PARAMS = frozenset({"gclid", "fbclid", "msclkid", "ref", "ref_", "_ga", "srsltid"})
+
+def normalize_product_url(url):
+    """
+    Identity of a product page: lower-cased host without "www.", no fragment,
+    no tracking parameters, remaining parameters sorted, no trailing slash.
+    """
+    parts = urlsplit((url or "").strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith("utm_")
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("", host, path, urlencode(query), ""))[2:][:1024]
+
+def _observed(product, canonical):
+    return (product.price, product.currency, product.rating) != (
+        canonical.last_price, canonical.currency, canonical.last_rating
+    )
+
+def record_observations(products, job=None, observed_at=None):
+    """
+    Folds a scrape's products into the canonical catalog: creates unseen
+    products, refreshes last_seen_at/title of known ones, and appends a
+    PriceObservation only where price, currency or rating changed.
+    Works in a constant number of queries per call. Returns the number of
+    observations written.
+    """
+    observed_at = observed_at or timezone.now()
+    latest = {}
+    for product in products:
+        if product.product_url:
+            latest[(product.site, normalize_product_url(product.product_url))] = product
+    if not latest:
+        return 0
+
+    with transaction.atomic():
+        keys_by_site = {}
+        for site, key in latest:
+            keys_by_site.setdefault(site, []).append(key)
+
+        def load():
+            found = {}
+            for site, keys in keys_by_site.items():
+                for canonical in CanonicalProduct.objects.select_for_update().filter(site=site, url_key__in=keys):
+                    found[(canonical.site, canonical.url_key)] = canonical
+            return found
+
+        existing = load()
+        new = [
+            CanonicalProduct(
+                site=site, url_key=key, product_url=product.product_url, title=product.title,
+                currency=product.currency, first_seen_at=observed_at, last_seen_at=observed_at,
+            )
+            for (site, key), product in latest.items() if (site, key) not in existing
+        ]
+        if new:
+            # A concurrent scrape may insert the same product first: skip it and reload
+            CanonicalProduct.objects.bulk_create(new, ignore_conflicts=True)
+            existing = load()
+
+        observations = []
+        for ident, product in latest.items():
+            canonical = existing[ident]
+            if _observed(product, canonical) or canonical.first_seen_at == observed_at:
+                observations.append(PriceObservation(
+                    product=canonical, observed_at=observed_at, price=product.price,
+                    currency=product.currency, rating=product.rating, job=job,
+                ))
+                canonical.last_price, canonical.currency, canonical.last_rating = (
+                    product.price, product.currency, product.rating
+                )
+            canonical.title = product.title
+            canonical.product_url = product.product_url
+            canonical.last_seen_at = observed_at
+
+        bulk_insert(PriceObservation, observations)
+        CanonicalProduct.objects.bulk_update(
+            existing.values(), ['title', 'product_url', 'currency', 'last_price', 'last_rating', 'last_seen_at'],
+            batch_size=500,
+        )
+    logger.info(f"Catalog: {len(latest)} products seen, {len(new)} new, {len(observations)} observations.")
+    return len(observations)
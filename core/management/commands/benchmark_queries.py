@@ -0,0 +1,121 @@
+import statistics
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+
+from core.models import Product, ScrapeBatch, ScrapeJob, Site
+
+SEED_CHUNK = 10000
+
+class Command(BaseCommand):
+    help = (
+        "Query-plan benchmark of the dashboard, export and history queries on a seeded "
+        "database: each query runs once in its old form (join through ScrapeJob, without the "
+        "composite indexes) and once in its current form. All rows and schema changes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help="Products to seed")
+        parser.add_argument('--batches', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per query (median is reported)")
+        parser.add_argument('--plans', action='store_true', help="Print the query plans")
+
+    def handle(self, *args, **options):
+        self.options = options
+        with transaction.atomic():
+            started = time.perf_counter()
+            user, batch = self._seed(options['rows'], max(1, options['batches']), max(1, options['users']))
+            self.stdout.write(f"Seeded {options['rows']} products in {options['batches']} batches "
+                              f"in {time.perf_counter() - started:.1f}s")
+
+            before = {
+                "dashboard": lambda: list(Product.objects.filter(job__batch=batch).order_by('-scraped_at')[:50]),
+                "export": lambda: list(Product.objects.filter(job__batch=batch).order_by('site', 'title')),
+                "batch count": lambda: Product.objects.filter(job__batch=batch).count(),
+                "history": lambda: list(ScrapeBatch.objects.filter(user=user).order_by('-created_at')[:30]
+                                        .annotate(count=Count('scrapejob_set__products'))),
+            }
+            after = {
+                "dashboard": lambda: list(Product.objects.filter(batch=batch).order_by('-scraped_at')[:50]),
+                "export": lambda: list(Product.objects.filter(batch=batch).order_by('site', 'title')),
+                "batch count": lambda: Product.objects.filter(batch=batch).count(),
+                "history": lambda: list(ScrapeBatch.objects.filter(user=user).order_by('-created_at')
+                                        .values('id', 'query', 'created_at', 'product_count')[:30]),
+            }
+
+            # Plain DDL statements rather than the schema editor context, which SQLite
+            # refuses inside a transaction; both SQLite and PostgreSQL roll DDL back
+            editor = connection.schema_editor()
+            indexes = [(model, index) for model in (Product, ScrapeBatch) for index in model._meta.indexes]
+            for model, index in indexes:
+                editor.execute(index.remove_sql(model, editor))
+            self._analyze()
+            old = {name: self._time(query) for name, query in before.items()}
+            self._plans("before", before)
+
+            for model, index in indexes:
+                editor.execute(index.create_sql(model, editor))
+            self._analyze()
+            new = {name: self._time(query) for name, query in after.items()}
+            self._plans("after", after)
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'Query':<14}{'before':>12}{'after':>12}{'speedup':>10}")
+        for name in before:
+            self.stdout.write(f"{name:<14}{old[name] * 1000:>10.2f}ms{new[name] * 1000:>10.2f}ms"
+                              f"{old[name] / max(new[name], 1e-9):>9.1f}x")
+
+    def _seed(self, rows, batches, users):
+        User = get_user_model()
+        owners = [User.objects.get_or_create(username=f'benchmark_user_{n}')[0] for n in range(users)]
+        batch_objs = ScrapeBatch.objects.bulk_create(
+            ScrapeBatch(user=owners[n % users], query=f"bench {n}") for n in range(batches)
+        )
+        job_objs = ScrapeJob.objects.bulk_create(
+            ScrapeJob(batch=batch, site=Site.OTHER, category_url=f"https://bench.example.com/c/{batch.id}")
+            for batch in batch_objs
+        )
+        for start in range(0, rows, SEED_CHUNK):
+            Product.objects.bulk_create([
+                Product(job=job_objs[i % batches], batch_id=job_objs[i % batches].batch_id,
+                        site=Site.DUMYAH if i % 3 else Site.OTHER, title=f"Product {i:07d}",
+                        price=10 + i % 90, currency="JOD", product_url=f"https://bench.example.com/p/{i}")
+                for i in range(start, min(start + SEED_CHUNK, rows))
+            ], batch_size=2000)
+        target = batch_objs[batches // 2]
+        return target.user, target
+
+    def _analyze(self):
+        # Fresh planner statistics so both runs are planned on equal terms
+        if connection.vendor in ('sqlite', 'postgresql'):
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+    def _time(self, query):
+        runs = []
+        for _ in range(max(1, self.options['repeat'])):
+            started = time.perf_counter()
+            query()
+            runs.append(time.perf_counter() - started)
+        return statistics.median(runs)
+
+    def _plans(self, label, queries):
+        if not self.options['plans']:
+            return
+        with connection.execute_wrapper(self._capture_sql):
+            for name, query in queries.items():
+                self._captured = []
+                query()
+                with connection.cursor() as cursor:
+                    prefix = connection.ops.explain_query_prefix()
+                    for sql, params in self._captured[-1:]:
+                        cursor.execute(f"{prefix} {sql}", params)
+                        plan = "\n    ".join(" ".join(str(col) for col in row) for row in cursor.fetchall())
+                        self.stdout.write(f"[{label}] {name}:\n    {plan}")
+
+    def _capture_sql(self, execute, sql, params, many, context):
+        self._captured.append((sql, params))
+        return execute(sql, params, many, context)
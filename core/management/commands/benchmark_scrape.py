@@ -0,0 +1,78 @@
+import asyncio
+import time
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from core.models import ScrapeBatch, ScrapeJob, Site
+from core.selector_detector import AISelelectorDetector
+from core.tasks import generate_batch_summary, run_ai_scrape_job
+from webscraper import llm
+
+BENCH_URL = "https://bench.example.com/category/toys"
+
+def synthetic_page(items):
+    """A category page in the shape the offline LLM backend's selectors expect."""
+    cards = "".join(
+        f'<div class="product-card"><a class="product-link" href="/p/{i}">'
+        f'<span class="product-title">Benchmark Product {i:05d}</span></a>'
+        f'<span class="price">{10 + i % 90}.{i % 100:02d} JOD</span><img src="/img/{i}.jpg"></div>'
+        for i in range(items)
+    )
+    return f"<html><body><div class='grid'>{cards}</div></body></html>"
+
+class Command(BaseCommand):
+    help = (
+        "Offline throughput benchmark of run_ai_scrape_job: the browser is replaced by a "
+        "synthetic category page and Gemini by the deterministic 'fake' LLM backend. "
+        "All rows written are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=5)
+        parser.add_argument('--items', type=int, default=100, help="Products per job")
+        parser.add_argument('--latency', type=float, default=0.2, help="Simulated LLM latency in seconds")
+
+    def handle(self, *args, **options):
+        jobs, items = max(1, options['jobs']), options['items']
+        html = synthetic_page(items)
+
+        def offline_scrape(url, api_key, pagination_type='auto', max_pages=1, max_items=0, fields=None):
+            # Same selector detection and extraction as the live scraper, minus the browser
+            detector = AISelelectorDetector(api_key=api_key)
+            selectors = asyncio.run(detector.get_selectors_from_gemini(html, url))
+            products = detector.extract_with_selectors(html, selectors, url, fields)
+            return products[:max_items] if max_items > 0 else products
+
+        llm.reset()
+        durations, products, queued = [], 0, []
+        with override_settings(LLM_BACKEND='fake', LLM_FAKE_LATENCY_S=options['latency'], LLM_CACHE_ENABLED=False), \
+                patch('core.tasks.scrape_sync', offline_scrape), \
+                patch('core.tasks.generate_batch_summary.delay', side_effect=queued.append), transaction.atomic():
+            user, _ = get_user_model().objects.get_or_create(username='benchmark_user')
+            started = time.perf_counter()
+            for n in range(jobs):
+                batch = ScrapeBatch.objects.create(user=user, query=f"{BENCH_URL}?run={n}")
+                job = ScrapeJob.objects.create(batch=batch, site=Site.OTHER, category_url=BENCH_URL,
+                                               fields=['title', 'price', 'image', 'product_url'], max_items=items)
+                job_started = time.perf_counter()
+                result = run_ai_scrape_job(job.id)
+                durations.append(time.perf_counter() - job_started)
+                products += result.get('products_count', 0)
+            wall = time.perf_counter() - started
+
+            # Summaries run on the 'llm' queue in production; time them separately
+            summary_started = time.perf_counter()
+            for batch_id in queued:
+                generate_batch_summary(batch_id)
+            summary_wall = time.perf_counter() - summary_started
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"Jobs:        {jobs} x {items} items (LLM latency {options['latency']}s)")
+        self.stdout.write(f"Wall time:   {wall:.2f}s ({jobs / wall:.2f} jobs/s, {products / wall:.1f} products/s)")
+        self.stdout.write(f"Per job:     mean {sum(durations) / len(durations):.3f}s, max {max(durations):.3f}s")
+        self.stdout.write(f"Summaries:   {len(queued)} queued, {summary_wall:.2f}s on the llm queue")
+        for purpose, totals in llm.get_metrics().items():
+            self.stdout.write(f"LLM [{purpose}]: {totals['calls']} calls, {totals['latency_s']}s total latency")
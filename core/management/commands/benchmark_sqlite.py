@@ -0,0 +1,139 @@
+import os
+import statistics
+import tempfile
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.db.utils import load_backend
+from django.utils import timezone
+
+from webscraper.db import sqlite_config
+
+BENCH_ALIAS = 'sqlite_benchmark'
+
+class Command(BaseCommand):
+    help = (
+        "SQLite concurrency benchmark: N writer threads insert product batches the way scrape "
+        "tasks do (read, then write, in one transaction) while M reader threads run the "
+        "dashboard query. Runs once with SQLite's defaults (rollback journal, deferred "
+        "transactions) and once with the WAL configuration from webscraper.db.sqlite_config, "
+        "each on a fresh temporary file, and reports \"database is locked\" errors and read latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds per configuration")
+        parser.add_argument('--rows', type=int, default=200, help="Products per write transaction")
+        parser.add_argument('--timeout', type=float, default=5.0, help="Busy timeout (s) in both configurations")
+
+    def handle(self, *args, **options):
+        configs = {
+            "default": lambda path: {
+                'ENGINE': 'django.db.backends.sqlite3', 'NAME': path,
+                'OPTIONS': {'timeout': options['timeout']},
+            },
+            "wal": lambda path: sqlite_config(path, timeout=options['timeout']),
+        }
+        results = {}
+        for name, make_config in configs.items():
+            with tempfile.TemporaryDirectory() as directory:
+                results[name] = self._run(make_config(os.path.join(directory, 'bench.sqlite3')), options)
+
+        self.stdout.write(f"{'Config':<9}{'writes/s':>10}{'reads/s':>10}{'locked':>8}"
+                          f"{'read p50':>11}{'read p95':>11}{'read max':>11}")
+        for name, r in results.items():
+            self.stdout.write(
+                f"{name:<9}{r['writes'] / r['elapsed']:>10.1f}{r['reads'] / r['elapsed']:>10.1f}{r['locked']:>8}"
+                f"{r['p50'] * 1000:>9.1f}ms{r['p95'] * 1000:>9.1f}ms{r['max'] * 1000:>9.1f}ms"
+            )
+
+    def _connect(self, config):
+        # Each thread gets its own connection under the benchmark alias (connections are thread-local)
+        settings_dict = {**connections['default'].settings_dict, 'TEST': {}, **config}
+        connections[BENCH_ALIAS] = load_backend(config['ENGINE']).DatabaseWrapper(settings_dict, BENCH_ALIAS)
+        return connections[BENCH_ALIAS]
+
+    def _run(self, config, options):
+        connection = self._connect(config)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TABLE bench_product (id INTEGER PRIMARY KEY, batch_id INTEGER NOT NULL, "
+                "title VARCHAR(500) NOT NULL, price DECIMAL NULL, scraped_at DATETIME NOT NULL)"
+            )
+            cursor.execute("CREATE INDEX bench_product_batch ON bench_product (batch_id, scraped_at)")
+        connection.close()
+        del connections[BENCH_ALIAS]
+
+        stop = threading.Event()
+        lock = threading.Lock()
+        totals = {'writes': 0, 'reads': 0, 'locked': 0, 'latencies': []}
+
+        def count(key):
+            with lock:
+                totals[key] += 1
+
+        def writer(n):
+            connection = self._connect(config)
+            batch_id = 0
+            while not stop.is_set():
+                batch_id += 1
+                rows = [(n * 1_000_000 + batch_id, f"Product {i}", 10 + i % 90, timezone.now().isoformat())
+                        for i in range(options['rows'])]
+                try:
+                    with transaction.atomic(using=BENCH_ALIAS), connection.cursor() as cursor:
+                        cursor.execute("SELECT COUNT(*) FROM bench_product WHERE batch_id = %s", [rows[0][0]])
+                        cursor.executemany(
+                            "INSERT INTO bench_product (batch_id, title, price, scraped_at) VALUES (%s, %s, %s, %s)",
+                            rows,
+                        )
+                    count('writes')
+                except OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                    count('locked')
+            connection.close()
+
+        def reader(n):
+            connection = self._connect(config)
+            latencies = []
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT MAX(batch_id) FROM bench_product")
+                        batch_id = cursor.fetchone()[0] or 0
+                        cursor.execute(
+                            "SELECT id, title, price FROM bench_product WHERE batch_id = %s "
+                            "ORDER BY scraped_at DESC LIMIT 50", [batch_id]
+                        )
+                        cursor.fetchall()
+                    latencies.append(time.perf_counter() - started)
+                except OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                    count('locked')
+            with lock:
+                totals['reads'] += len(latencies)
+                totals['latencies'].extend(latencies)
+            connection.close()
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(options['writers'])]
+        threads += [threading.Thread(target=reader, args=(n,)) for n in range(options['readers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        stop.wait(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(totals['latencies']) or [0.0]
+        return {
+            'writes': totals['writes'], 'reads': totals['reads'], 'locked': totals['locked'],
+            'elapsed': elapsed, 'p50': statistics.median(latencies),
+            'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            'max': latencies[-1],
+        }
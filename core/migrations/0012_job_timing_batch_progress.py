@@ -0,0 +1,43 @@
+# Generated by Django 5.0 on 2026-10-19 03:06
+
+from django.db import migrations, models
+
+
+def count_finished_jobs(apps, schema_editor):
+    ScrapeBatch = apps.get_model('core', 'ScrapeBatch')
+    ScrapeJob = apps.get_model('core', 'ScrapeJob')
+    finished = (ScrapeJob.objects.filter(status__in=['DONE', 'ERROR'])
+                .values('batch_id').annotate(n=models.Count('id')))
+    for row in finished:
+        ScrapeBatch.objects.filter(id=row['batch_id']).update(jobs_finished=row['n'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_alter_scrapejob_max_items'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapebatch',
+            name='jobs_finished',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='scrapejob',
+            name='duration',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scrapejob',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scrapejob',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(count_finished_jobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0 on 2026-10-19 03:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_job_timing_batch_progress'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='change',
+            field=models.CharField(blank=True, choices=[('NEW', 'New'), ('REMOVED', 'Removed'), ('PRICE_CHANGED', 'Price changed')], max_length=16),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='previous_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.CreateModel(
+            name='ScrapeSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category_url', models.URLField(max_length=1024)),
+                ('site', models.CharField(choices=[('dumyah', 'DUMYAH'), ('other', 'Other')], default='other', max_length=32)),
+                ('fields', models.JSONField(default=list)),
+                ('max_items', models.PositiveIntegerField(default=0)),
+                ('max_pages', models.PositiveIntegerField(default=0)),
+                ('pagination_type', models.CharField(default='single', max_length=20)),
+                ('interval_hours', models.PositiveIntegerField(default=24)),
+                ('enabled', models.BooleanField(default=True)),
+                ('next_run_at', models.DateTimeField(db_index=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('snapshot', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scrape_schedules', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='scrapejob',
+            name='schedule',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='core.scrapeschedule'),
+        ),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 5.0 on 2026-10-19 03:19
+
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TRACKING_PARAMS = frozenset({"gclid", "fbclid", "msclkid", "ref", "ref_", "_ga", "srsltid"})
+
+
+def normalize_product_url(url):
+    # Frozen copy of core.catalog.normalize_product_url at the time of this migration
+    parts = urlsplit((url or "").strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith("utm_")
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("", host, path, urlencode(query), ""))[2:][:1024]
+
+
+def backfill_price_history(apps, schema_editor):
+    """Builds the catalog from existing per-job products, oldest first, one observation per change."""
+    Product = apps.get_model('core', 'Product')
+    CanonicalProduct = apps.get_model('core', 'CanonicalProduct')
+    PriceObservation = apps.get_model('core', 'PriceObservation')
+
+    canonical, observations = {}, []
+    rows = (Product.objects.exclude(product_url='').exclude(change='REMOVED')
+            .order_by('scraped_at', 'id').values_list('site', 'product_url', 'title', 'price', 'currency', 'rating', 'scraped_at', 'job_id'))
+    for site, url, title, price, currency, rating, seen_at, job_id in rows.iterator(chunk_size=2000):
+        ident = (site, normalize_product_url(url))
+        product = canonical.get(ident)
+        if product is None:
+            product = canonical[ident] = CanonicalProduct.objects.create(
+                site=site, url_key=ident[1], product_url=url, title=title, currency=currency,
+                first_seen_at=seen_at, last_seen_at=seen_at,
+            )
+            changed = True
+        else:
+            changed = (price, currency, rating) != (product.last_price, product.currency, product.last_rating)
+        if changed:
+            observations.append(PriceObservation(product=product, observed_at=seen_at, price=price,
+                                                 currency=currency, rating=rating, job_id=job_id))
+        product.title, product.product_url, product.last_seen_at = title, url, seen_at
+        product.last_price, product.currency, product.last_rating = price, currency, rating
+        if len(observations) >= 2000:
+            PriceObservation.objects.bulk_create(observations)
+            observations = []
+    PriceObservation.objects.bulk_create(observations)
+    CanonicalProduct.objects.bulk_update(
+        canonical.values(), ['title', 'product_url', 'currency', 'last_price', 'last_rating', 'last_seen_at'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_scrape_schedules'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CanonicalProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('site', models.CharField(choices=[('dumyah', 'DUMYAH'), ('other', 'Other')], default='other', max_length=32)),
+                ('url_key', models.CharField(max_length=1024)),
+                ('product_url', models.URLField(max_length=2048)),
+                ('title', models.CharField(max_length=500)),
+                ('currency', models.CharField(blank=True, max_length=10)),
+                ('last_price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('last_rating', models.FloatField(blank=True, null=True)),
+                ('first_seen_at', models.DateTimeField()),
+                ('last_seen_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PriceObservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('observed_at', models.DateTimeField()),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('currency', models.CharField(blank=True, max_length=10)),
+                ('rating', models.FloatField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='canonicalproduct',
+            constraint=models.UniqueConstraint(fields=('url_key', 'site'), name='canonical_product_url_key_site'),
+        ),
+        migrations.AddField(
+            model_name='priceobservation',
+            name='job',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.scrapejob'),
+        ),
+        migrations.AddField(
+            model_name='priceobservation',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='observations', to='core.canonicalproduct'),
+        ),
+        migrations.AddIndex(
+            model_name='priceobservation',
+            index=models.Index(fields=['product', 'observed_at'], name='price_obs_product_time'),
+        ),
+        migrations.RunPython(backfill_price_history, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0 on 2026-10-19 03:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_batch_ids(apps, schema_editor):
+    Product = apps.get_model('core', 'Product')
+    ScrapeJob = apps.get_model('core', 'ScrapeJob')
+    Product.objects.filter(batch__isnull=True).update(
+        batch_id=models.Subquery(ScrapeJob.objects.filter(id=models.OuterRef('job_id')).values('batch_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_price_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='batch',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='products', to='core.scrapebatch'),
+        ),
+        migrations.RunPython(copy_batch_ids, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['batch', '-scraped_at'], name='product_batch_scraped'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['batch', 'site', 'title'], name='product_batch_site_title'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['job', 'price'], name='product_job_price'),
+        ),
+        migrations.AddIndex(
+            model_name='scrapebatch',
+            index=models.Index(fields=['user', '-created_at'], name='batch_user_created'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0 on 2026-10-19 03:27
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_products(apps, schema_editor):
+    ScrapeBatch = apps.get_model('core', 'ScrapeBatch')
+    ScrapeJob = apps.get_model('core', 'ScrapeJob')
+    Product = apps.get_model('core', 'Product')
+
+    def counted(field):
+        return models.Subquery(
+            Product.objects.filter(**{field: models.OuterRef('pk')}).order_by()
+            .values(field).annotate(n=models.Count('id')).values('n')
+        )
+    ScrapeJob.objects.update(product_count=Coalesce(counted('job'), 0))
+    ScrapeBatch.objects.update(
+        product_count=Coalesce(counted('batch'), 0),
+        job_count=Coalesce(models.Subquery(
+            ScrapeJob.objects.filter(batch=models.OuterRef('pk')).order_by()
+            .values('batch').annotate(n=models.Count('id')).values('n')
+        ), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_product_batch_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapebatch',
+            name='job_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='scrapebatch',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='scrapejob',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_products, migrations.RunPython.noop),
+    ]
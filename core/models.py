@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.core.cache import cache
+from webscraper.status import publish
 
 # This file defines your database tables.
 
@@ -14,11 +16,116 @@ class ScrapeBatch(models.Model):
     query = models.CharField(max_length=200, blank=True) 
     ai_summary = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Wall-clock span of the batch's jobs (first start to last finish), see record_job_finished()
     duration = models.FloatField(null=True, blank=True)
+    jobs_finished = models.PositiveIntegerField(default=0)
+    job_count = models.PositiveIntegerField(default=1)
+    # Kept up to date at insert time by record_products(), so listings never count rows
+    product_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # History page: WHERE user_id = ? ORDER BY created_at DESC
+        indexes = [models.Index(fields=['user', '-created_at'], name='batch_user_created')]
     
     def __str__(self):
         return f"Batch {self.id} ({self.query})"
 
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        super().save(*args, **kwargs)
+        if created:
+            self.invalidate_history(self.user_id)
+
+    @staticmethod
+    def history_cache_key(user_id):
+        return f"history:{user_id}"
+
+    @classmethod
+    def invalidate_history(cls, user_id):
+        """Drops the user's cached history listing (see core.views.history)."""
+        cache.delete(cls.history_cache_key(user_id))
+
+    @classmethod
+    def record_products(cls, batch_id, job_id, count):
+        """Adds count (negative to remove) to the stored product counts of a job and its batch."""
+        if count:
+            ScrapeJob.objects.filter(id=job_id).update(product_count=models.F('product_count') + count)
+            cls.objects.filter(id=batch_id).update(product_count=models.F('product_count') + count)
+
+    @classmethod
+    def record_job_finished(cls, batch_id):
+        """
+        Counts one more finished job and recomputes the batch duration from
+        its jobs' timestamps, in single UPDATE statements so concurrent jobs
+        of the same batch never overwrite each other's state, then publishes
+        the new status.
+        """
+        cls.objects.filter(id=batch_id).update(jobs_finished=models.F('jobs_finished') + 1)
+        span = ScrapeJob.objects.filter(batch_id=batch_id, finished_at__isnull=False).aggregate(
+            start=models.Min('started_at'), end=models.Max('finished_at')
+        )
+        if span['start'] and span['end']:
+            cls.objects.filter(id=batch_id).update(duration=(span['end'] - span['start']).total_seconds())
+        cls.invalidate_history(cls.objects.filter(id=batch_id).values_list('user_id', flat=True).first())
+        cls.publish_status(batch_id)
+
+    @classmethod
+    def publish_status(cls, batch_id):
+        """
+        Writes the batch's polling status (see core.views.job_status) to the
+        cache. Called by the tasks on every job state change; returns the cache
+        entry, or None if the batch no longer exists.
+        """
+        batch = cls.objects.filter(id=batch_id).first()
+        if batch is None:
+            return None
+        jobs = list(batch.scrapejob_set.order_by('-id').values("id", "status", "note"))
+        return publish('batch', batch.id, batch.user_id, {
+            "jobs": jobs,
+            "progress": {"finished": batch.jobs_finished, "total": len(jobs)},
+            "duration": batch.duration,
+            "product_count": batch.product_count,
+            "summary_ready": bool(batch.ai_summary),
+        })
+
+class ScrapeSchedule(models.Model):
+    """
+    A category URL re-scraped every interval_hours (queued by Celery beat,
+    see core.tasks.run_due_schedules). Each run is compared with the snapshot
+    of the previous one and only new, removed and re-priced products are stored.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='scrape_schedules')
+    category_url = models.URLField(max_length=1024)
+    site = models.CharField(max_length=32, choices=Site.choices, default=Site.OTHER)
+    fields = models.JSONField(default=list)
+    max_items = models.PositiveIntegerField(default=0)
+    max_pages = models.PositiveIntegerField(default=0)
+    pagination_type = models.CharField(max_length=20, default='single')
+    interval_hours = models.PositiveIntegerField(default=24)
+    enabled = models.BooleanField(default=True)
+    next_run_at = models.DateTimeField(db_index=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    # product_url -> {"title", "price", "currency"} as of the last successful run
+    snapshot = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Every {self.interval_hours}h: {self.category_url}"
+
+    def start_job(self):
+        """Creates the batch and pending job for one run of this schedule."""
+        batch = ScrapeBatch.objects.create(user=self.user, query=f"Scheduled: {self.category_url}"[:200], job_count=1)
+        return ScrapeJob.objects.create(
+            batch=batch,
+            schedule=self,
+            site=self.site,
+            category_url=self.category_url,
+            fields=self.fields,
+            max_items=self.max_items,
+            max_pages=self.max_pages,
+            pagination_type=self.pagination_type,
+        )
+
 class ScrapeJob(models.Model):
     """ A 'Job' is one specific scrape (e.g., scrape 'temu' for 'dresses'). """
     
@@ -29,6 +136,8 @@ class ScrapeJob(models.Model):
         ERROR = 'ERROR', 'Error'
 
     batch = models.ForeignKey(ScrapeBatch, on_delete=models.CASCADE, related_name="scrapejob_set")
+    # Set for runs of a recurring schedule, whose products are stored as changes only
+    schedule = models.ForeignKey(ScrapeSchedule, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
     site = models.CharField(max_length=32, choices=Site.choices, default=Site.OTHER)
     note = models.TextField(blank=True, null=True)
     
@@ -67,13 +176,26 @@ class ScrapeJob(models.Model):
     )
     note = models.TextField(blank=True) 
     created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)
+    product_count = models.PositiveIntegerField(default=0)
     selectors = models.JSONField(default=dict, blank=True)
     used_api = models.BooleanField(default=False, help_text="Whether internal API was used")
 
 class Product(models.Model):
     """ One product found during a scrape. """
+
+    class Change(models.TextChoices):
+        NEW = 'NEW', 'New'
+        REMOVED = 'REMOVED', 'Removed'
+        PRICE_CHANGED = 'PRICE_CHANGED', 'Price changed'
     
     job = models.ForeignKey(ScrapeJob, on_delete=models.CASCADE, related_name='products')
+    # Copy of job.batch_id so batch-level reads skip the join through ScrapeJob;
+    # indexed by the composite indexes below rather than on its own
+    batch = models.ForeignKey(ScrapeBatch, on_delete=models.CASCADE, related_name='products',
+                              null=True, blank=True, db_index=False)
     
     site = models.CharField(max_length=32, choices=Site.choices)
     title = models.CharField(max_length=500)
@@ -84,6 +206,63 @@ class Product(models.Model):
     search_query = models.CharField(max_length=1024, blank=True) 
     rating = models.FloatField(null=True, blank=True)
     scraped_at = models.DateTimeField(auto_now_add=True)
+    # Scheduled runs only: how this product differs from the previous run (blank for full scrapes)
+    change = models.CharField(max_length=16, choices=Change.choices, blank=True)
+    previous_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Dashboard: WHERE batch_id = ? ORDER BY scraped_at DESC (also serves per-batch counts)
+            models.Index(fields=['batch', '-scraped_at'], name='product_batch_scraped'),
+            # CSV export: WHERE batch_id = ? ORDER BY site, title
+            models.Index(fields=['batch', 'site', 'title'], name='product_batch_site_title'),
+            # Per-store count and average price on the dashboard, answered from the index
+            models.Index(fields=['job', 'price'], name='product_job_price'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.batch_id is None and self.job_id is not None:
+            self.batch_id = self.job.batch_id
+        super().save(*args, **kwargs)
+
+class CanonicalProduct(models.Model):
+    """
+    One product across all scrapes, keyed by site + normalized URL
+    (core.catalog.normalize_product_url). Its prices over time are the
+    PriceObservation rows; the latest one is mirrored here.
+    """
+    site = models.CharField(max_length=32, choices=Site.choices, default=Site.OTHER)
+    url_key = models.CharField(max_length=1024)
+    product_url = models.URLField(max_length=2048)
+    title = models.CharField(max_length=500)
+    currency = models.CharField(max_length=10, blank=True)
+    last_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    last_rating = models.FloatField(null=True, blank=True)
+    first_seen_at = models.DateTimeField()
+    last_seen_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['url_key', 'site'], name='canonical_product_url_key_site')]
+
+    def __str__(self):
+        return self.title
+
+class PriceObservation(models.Model):
+    """
+    Append-only price series of a CanonicalProduct. A row is written only when
+    price, currency or rating differ from the previous observation, so the
+    series is a step function and stable products cost nothing per scrape.
+    """
+    product = models.ForeignKey(CanonicalProduct, on_delete=models.CASCADE, related_name='observations')
+    observed_at = models.DateTimeField()
+    price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    currency = models.CharField(max_length=10, blank=True)
+    rating = models.FloatField(null=True, blank=True)
+    job = models.ForeignKey(ScrapeJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        # Range scans of one product's history: WHERE product_id = ? AND observed_at BETWEEN ...
+        indexes = [models.Index(fields=['product', 'observed_at'], name='price_obs_product_time')]
 
 class BatchInsight(models.Model):
     """ Stores the AI-generated summary for a batch. """
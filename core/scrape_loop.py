@@ -0,0 +1,92 @@
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import os
+import threading
+from django.conf import settings
+
+from .selector_detector import BrowserPool
+
+logger = logging.getLogger(__name__)
+
+class ScrapeLoop:
+    """
+    A long-lived asyncio event loop in a background thread of the worker
+    process. Tasks hand it coroutines with run() and block until they finish,
+    so with a thread pool (`--pool=threads`) one process drives several
+    scrapes at once, at most `concurrency` of them, all sharing one
+    BrowserPool instead of launching Chromium per task.
+    """
+
+    def __init__(self, concurrency=4, max_contexts=4):
+        self.concurrency = max(1, concurrency)
+        self.loop = asyncio.new_event_loop()
+        self.pool = None
+        self._semaphore = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name="scrape-loop", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        self.pool = BrowserPool(max_contexts=max_contexts)
+
+    def _serve(self):
+        asyncio.set_event_loop(self.loop)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.loop.call_soon(self._ready.set)
+        self.loop.run_forever()
+
+    async def _bounded(self, make_coro):
+        async with self._semaphore:
+            return await make_coro(self.pool)
+
+    def run(self, make_coro, timeout=None):
+        """
+        Runs make_coro(pool) on the loop and returns its result. Waits up to
+        timeout seconds (default BROWSER_TASK_TIME_LIMIT_S), then cancels it.
+        """
+        if timeout is None:
+            timeout = getattr(settings, 'BROWSER_TASK_TIME_LIMIT_S', 3600)
+        future = asyncio.run_coroutine_threadsafe(self._bounded(make_coro), self.loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def close(self, timeout=30):
+        """Closes the shared browser and stops the loop."""
+        if not self.loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.pool.close(), self.loop).result(timeout)
+        except Exception as e:
+            logger.warning(f"Scrape loop: browser shutdown failed: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+_LOOP = None
+_LOOP_PID = None
+_LOOP_LOCK = threading.Lock()
+
+def get_scrape_loop():
+    """The ScrapeLoop of this worker process, started on first use (after the prefork fork)."""
+    global _LOOP, _LOOP_PID
+    with _LOOP_LOCK:
+        if _LOOP is None or _LOOP_PID != os.getpid():
+            _LOOP = ScrapeLoop(
+                concurrency=getattr(settings, 'SCRAPE_ASYNC_CONCURRENCY', 4),
+                max_contexts=getattr(settings, 'SCRAPE_ASYNC_MAX_CONTEXTS', 4),
+            )
+            _LOOP_PID = os.getpid()
+            logger.info(f"Scrape loop started in process {_LOOP_PID} (concurrency {_LOOP.concurrency}).")
+        return _LOOP
+
+@atexit.register
+def shutdown():
+    """Stops this process's loop, if any (also used by tests)."""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is not None and _LOOP_PID == os.getpid():
+            _LOOP.close()
+        _LOOP = None
@@ -6,10 +6,14 @@ import os
 from typing import Dict, Optional, List
 from urllib.parse import urlparse
 import random
+from collections import defaultdict
+from contextlib import asynccontextmanager
 from pathlib import Path
 from bs4 import BeautifulSoup
 import urllib.robotparser
 from django.conf import settings
+from webscraper import llm
+from .throttle import get_governor
 
 try:
     from playwright.async_api import async_playwright, Page
@@ -20,15 +24,9 @@ logger = logging.getLogger(__name__)
 
 class AISelelectorDetector:
     def __init__(self, api_key=None):
-        from google import genai as _genai_new
-        self.client = None
         self.model_name = 'gemini-2.5-flash'
-        key = api_key or os.getenv('GOOGLE_API_KEY')
-        if key and _genai_new:
-            try:
-                self.client = _genai_new.Client(api_key=key)
-            except Exception:
-                self.client = None
+        # Calls go through the shared, process-wide client for this key
+        self.api_key = api_key or os.getenv('GOOGLE_API_KEY')
         self.selector_cache = {}
 
     def _is_garbage_title(self, text: str) -> bool:
@@ -49,17 +47,18 @@ class AISelelectorDetector:
         if domain in self.selector_cache:
             return self.selector_cache[domain]
         
-        soup = BeautifulSoup(html, 'html.parser')
-        for s in soup(['script', 'style', 'svg', 'path', 'footer', 'nav', 'header']):
-            s.decompose()
-        clean_html = soup.prettify()[:40000]
+        # Parsing a full page is CPU-bound: keep it off the shared event loop
+        clean_html = await asyncio.to_thread(self._clean_html, html)
 
         prompt = f"Return ONLY a JSON object with CSS selectors for product_container, title, price, image, and product_url for e-commerce page {url}. HTML: {clean_html}"
         
         try:
-            if self.client:
-                resp = self.client.models.generate_content(model=self.model_name, contents=prompt)
-                json_match = re.search(r'\{.*\}', resp.text, re.DOTALL)
+            if llm.is_available(self.api_key):
+                # Blocking SDK call: run it off the event loop
+                text, _ = await asyncio.to_thread(
+                    llm.generate, prompt, model=self.model_name, api_key=self.api_key, purpose="selectors"
+                )
+                json_match = re.search(r'\{.*\}', text, re.DOTALL)
                 if json_match:
                     selectors = json.loads(json_match.group())
                     self.selector_cache[domain] = selectors
@@ -69,6 +68,12 @@ class AISelelectorDetector:
         
         return {"product_container": ".product-item, .product-card, .item", "confidence": "low"}
 
+    def _clean_html(self, html: str) -> str:
+        soup = BeautifulSoup(html, 'html.parser')
+        for s in soup(['script', 'style', 'svg', 'path', 'footer', 'nav', 'header']):
+            s.decompose()
+        return soup.prettify()[:40000]
+
     def extract_with_selectors(self, html: str, selectors: Dict, page_url: str, fields: List[str] = None) -> List[Dict]:
         products = []
         soup = BeautifulSoup(html, 'html.parser')
@@ -122,10 +127,87 @@ class AISelelectorDetector:
         p = urlparse(base)
         return f"{p.scheme}://{p.netloc}/{href.lstrip('/')}"
 
+USER_DATA_DIR = Path.cwd() / "user_data"
+
+async def launch_store_context(playwright, domain, user_data_dir_base=USER_DATA_DIR):
+    """Chromium with the store's persistent profile (cookies, consent banners) under user_data/<domain>."""
+    return await playwright.chromium.launch_persistent_context(
+        user_data_dir=str(user_data_dir_base / domain),
+        headless=False,
+        args=['--disable-blink-features=AutomationControlled'],
+        viewport={'width': 1920, 'height': 1080}
+    )
+
+class BrowserPool:
+    """
+    One Playwright driver and one persistent browser context per store,
+    shared by every scrape running on the same event loop: each scrape gets
+    its own page instead of launching Chromium. At most max_contexts stores
+    are open at once: the least recently used idle one is closed to make
+    room, and when every open context is in use, a scrape of another store
+    waits until one is released.
+    """
+
+    def __init__(self, max_contexts=4, user_data_dir_base=USER_DATA_DIR):
+        self.max_contexts = max(1, max_contexts)
+        self.user_data_dir_base = user_data_dir_base
+        self._playwright = None
+        self._contexts = {}  # domain -> context, least recently used first
+        self._in_use = defaultdict(int)
+        self._lock = asyncio.Condition()
+
+    async def _context(self, domain):
+        async with self._lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            while domain not in self._contexts and len(self._contexts) >= self.max_contexts:
+                idle = [d for d in self._contexts if not self._in_use[d]]
+                if idle:
+                    await self._contexts.pop(idle[0]).close()
+                else:
+                    await self._lock.wait()
+            context = self._contexts.pop(domain, None)
+            if context is None:
+                context = await launch_store_context(self._playwright, domain, self.user_data_dir_base)
+                # A crashed or closed browser is relaunched on next use
+                context.on("close", lambda _: self._contexts.pop(domain, None) if self._contexts.get(domain) is context else None)
+                logger.info(f"Browser pool: opened context for {domain} ({len(self._contexts) + 1} open)")
+            self._contexts[domain] = context
+            self._in_use[domain] += 1
+            return context
+
+    @asynccontextmanager
+    async def page(self, domain):
+        context = await self._context(domain)
+        try:
+            page = await context.new_page()
+            try:
+                yield page
+            finally:
+                await page.close()
+        finally:
+            async with self._lock:
+                self._in_use[domain] -= 1
+                self._lock.notify_all()
+
+    async def close(self):
+        async with self._lock:
+            for context in list(self._contexts.values()):
+                try:
+                    await context.close()
+                except Exception as e:
+                    logger.warning(f"Browser pool: error closing context: {e}")
+            self._contexts.clear()
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
 class PlaywrightScraper:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, browser_pool=None):
         self.detector = AISelelectorDetector(api_key=api_key)
-        self.user_data_dir_base = Path.cwd() / "user_data"
+        # Shared browser in the async worker mode (core.scrape_loop); None launches one per scrape
+        self.browser_pool = browser_pool
+        self.user_data_dir_base = USER_DATA_DIR
         self.user_agent = "MyEcommerceBot/1.0"
         
         self.excluded_sites = [
@@ -163,102 +245,127 @@ class PlaywrightScraper:
             return True
 
     async def scrape(self, url: str, pagination_type: str = 'auto', max_pages: int = 1, max_items: int = 0, fields: List[str] = None) -> List[Dict]:
-        if not self.can_scrape(url):
+        # robots.txt is fetched with blocking I/O: keep it off the (possibly shared) event loop
+        if not await asyncio.to_thread(self.can_scrape, url):
             logger.error(f" Scraping blocked by robots.txt policy for {url}")
             raise PermissionError("Access Denied: This website's robots.txt policy disallows automated scraping.")
 
-        collected_products = {} 
+        # At most SCRAPE_DOMAIN_CONCURRENCY browser sessions per store, across all workers
+        async with get_governor().aslot(url):
+            return await self._scrape_pages(url, pagination_type, max_pages, max_items, fields)
+
+    async def _scrape_pages(self, url, pagination_type, max_pages, max_items, fields):
+        domain = urlparse(url).netloc
+        if self.browser_pool is not None:
+            async with self.browser_pool.page(domain) as page:
+                return await self._collect(page, url, max_pages, max_items, fields)
 
         async with async_playwright() as p:
-            domain = urlparse(url).netloc
-            context = await p.chromium.launch_persistent_context(
-                user_data_dir=str(self.user_data_dir_base / domain),
-                headless=False,
-                args=['--disable-blink-features=AutomationControlled'],
-                viewport={'width': 1920, 'height': 1080}
-            )
-            
-            page = await context.new_page()
-            await page.set_extra_http_headers({"User-Agent": self.user_agent})
+            context = await launch_store_context(p, domain, self.user_data_dir_base)
+            try:
+                page = await context.new_page()
+                return await self._collect(page, url, max_pages, max_items, fields)
+            finally:
+                await context.close()
+
+    async def _collect(self, page, url, max_pages, max_items, fields):
+        governor = get_governor()
+        collected_products = {} 
+
+        await page.set_extra_http_headers({"User-Agent": self.user_agent})
+        
+        logger.info(f"Navigating to {url}")
+        await governor.athrottle(url)
+        await page.goto(url, wait_until="load", timeout=90000)
+        
+        current_page = 1
+        while True:
+            logger.info(f" Processing Page {current_page}...")
             
-            logger.info(f"Navigating to {url}")
-            await page.goto(url, wait_until="load", timeout=90000)
+            try:
+                await page.wait_for_selector(".product-item, .item, .product-card", timeout=15000)
+            except: 
+                logger.warning("Timed out waiting for product selectors.")
+
+            await page.wait_for_timeout(3000)
+            for _ in range(3):
+                await page.evaluate("window.scrollBy(0, 800)")
+                await page.wait_for_timeout(1500)
+
+            html = await page.content()
+            selectors = await self.detector.get_selectors_from_gemini(html, page.url)
+            batch = await asyncio.to_thread(self.detector.extract_with_selectors, html, selectors, page.url, fields)
             
-            current_page = 1
-            while True:
-                logger.info(f" Processing Page {current_page}...")
-                
-                try:
-                    await page.wait_for_selector(".product-item, .item, .product-card", timeout=15000)
-                except: 
-                    logger.warning("Timed out waiting for product selectors.")
-
-                await page.wait_for_timeout(3000)
-                for _ in range(3):
-                    await page.evaluate("window.scrollBy(0, 800)")
-                    await page.wait_for_timeout(1500)
-
-                html = await page.content()
-                selectors = await self.detector.get_selectors_from_gemini(html, page.url)
-                batch = self.detector.extract_with_selectors(html, selectors, page.url, fields)
-                
-                for item in batch:
-                    p_url = item.get('product_url')
-                    if p_url and p_url not in collected_products:
-                        collected_products[p_url] = item
+            for item in batch:
+                p_url = item.get('product_url')
+                if p_url and p_url not in collected_products:
+                    collected_products[p_url] = item
 
-                logger.info(f" Batch: {len(batch)} | Total unique: {len(collected_products)}")
+            logger.info(f" Batch: {len(batch)} | Total unique: {len(collected_products)}")
 
-                if (max_items > 0 and len(collected_products) >= max_items) or current_page >= max_pages:
-                    break
+            if (max_items > 0 and len(collected_products) >= max_items) or current_page >= max_pages:
+                break
 
-                # Handle Targeted Pagination using .pagination-next from your inspector
-                next_btn = await page.query_selector(".pagination-next")
+            # Handle Targeted Pagination using .pagination-next from your inspector
+            next_btn = await page.query_selector(".pagination-next")
 
-                if next_btn and await next_btn.is_visible():
-                    old_url = page.url
-                    # Explicitly evaluate the BEFORE state inside the browser
-                    first_item_before = await page.evaluate(
-                        "() => document.querySelector('.product-item a, .item a, .product-card a')?.href"
-                    )
+            if next_btn and await next_btn.is_visible():
+                old_url = page.url
+                # Explicitly evaluate the BEFORE state inside the browser
+                first_item_before = await page.evaluate(
+                    "() => document.querySelector('.product-item a, .item a, .product-card a')?.href"
+                )
 
-                    await next_btn.scroll_into_view_if_needed()
-                    await page.wait_for_timeout(1500)
-                    
-                    # Direct JS click to bypass potential overlays
-                    await next_btn.evaluate("el => el.click()")
-                    logger.info(f"Clicked Next. Waiting for content refresh (Page {current_page} -> {current_page + 1})")
-                    
-                    try:
-                        # Monitor DOM state: wait for the first product link to NOT equal the old one
-                        await page.wait_for_function(
-                            """(oldItem) => {
-                                const firstProd = document.querySelector('.product-item a, .item a, .product-card a');
-                                const currentFirstUrl = firstProd ? firstProd.href : null;
-                                return currentFirstUrl !== oldItem;
-                            }""", 
-                            first_item_before, 
-                            timeout=20000 
-                        )
-                        # Settle time for AJAX hydration
-                        await page.wait_for_timeout(4000)
-                        await page.wait_for_load_state("networkidle")
-                    except Exception:
-                        if page.url != old_url:
-                            logger.info("URL changed but content signature remained static. Continuing.")
-                        else:
-                            logger.warning("No URL or content change detected after 20s. Breaking pagination.")
-                            break
-                    current_page += 1
-                else:
-                    logger.info("No visible 'Next' button found.")
-                    break
+                await next_btn.scroll_into_view_if_needed()
+                await page.wait_for_timeout(1500)
+                
+                # Direct JS click to bypass potential overlays
+                await governor.athrottle(url)
+                await next_btn.evaluate("el => el.click()")
+                logger.info(f"Clicked Next. Waiting for content refresh (Page {current_page} -> {current_page + 1})")
+                
+                try:
+                    # Monitor DOM state: wait for the first product link to NOT equal the old one
+                    await page.wait_for_function(
+                        """(oldItem) => {
+                            const firstProd = document.querySelector('.product-item a, .item a, .product-card a');
+                            const currentFirstUrl = firstProd ? firstProd.href : null;
+                            return currentFirstUrl !== oldItem;
+                        }""", 
+                        first_item_before, 
+                        timeout=20000 
+                    )
+                    # Settle time for AJAX hydration
+                    await page.wait_for_timeout(4000)
+                    await page.wait_for_load_state("networkidle")
+                except Exception:
+                    if page.url != old_url:
+                        logger.info("URL changed but content signature remained static. Continuing.")
+                    else:
+                        logger.warning("No URL or content change detected after 20s. Breaking pagination.")
+                        break
+                current_page += 1
+            else:
+                logger.info("No visible 'Next' button found.")
+                break
 
-            await context.close()
-            final_data = list(collected_products.values())
-            return final_data[:max_items] if max_items > 0 else final_data
+        final_data = list(collected_products.values())
+        return final_data[:max_items] if max_items > 0 else final_data
 
 def scrape_sync(url, api_key, pagination_type='auto', max_pages=1, max_items=0, fields=None):
+    """
+    Runs one scrape to completion from synchronous code (Celery tasks).
+    With SCRAPE_WORKER_MODE='async' the coroutine joins the worker process's
+    long-lived event loop and shared browser (core.scrape_loop); otherwise it
+    gets a fresh event loop and browser of its own.
+    """
+    if getattr(settings, 'SCRAPE_WORKER_MODE', 'sync') == 'async':
+        from .scrape_loop import get_scrape_loop
+        loop = get_scrape_loop()
+        return loop.run(lambda pool: PlaywrightScraper(api_key=api_key, browser_pool=pool).scrape(
+            url, pagination_type, max_pages, max_items, fields
+        ))
+
     async def _run():
         s = PlaywrightScraper(api_key=api_key)
         return await s.scrape(url, pagination_type, max_pages, max_items, fields)
@@ -266,4 +373,4 @@ def scrape_sync(url, api_key, pagination_type='auto', max_pages=1, max_items=0,
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     try: return loop.run_until_complete(_run())
-    finally: loop.close()
\ No newline at end of file
+    finally: loop.close()
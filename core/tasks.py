@@ -3,31 +3,154 @@ import os
 import re
 import unicodedata
 import time  
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
 from urllib.parse import urljoin
+from celery import chain, group
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from webscraper.celery import app
 
 # App-specific imports
-from core.models import ScrapeBatch, ScrapeJob, Product
+from core.models import ScrapeBatch, ScrapeJob, ScrapeSchedule, Product
 from core.ai import summarize_batch
 from core.analytics import compute_batch_stats
+from core.bulk import bulk_insert
+from core.catalog import record_observations
 from core.selector_detector import scrape_sync
+from core.throttle import DomainBusy, domain_of
 
 logger = logging.getLogger(__name__)
 
+def _finish_job(job, status, note, start_time):
+    """
+    Records a job's outcome with targeted updates (never a full batch save),
+    updates the batch's progress and duration, and queues the summary once
+    the batch has no unfinished jobs. The outcome is written only while the
+    job is still unfinished, so a redelivered task never counts a job twice.
+    """
+    job.status = status
+    job.note = note
+    job.finished_at = timezone.now()
+    job.duration = time.time() - start_time
+    finished = ScrapeJob.objects.filter(
+        id=job.id, status__in=[ScrapeJob.Status.PENDING, ScrapeJob.Status.RUNNING]
+    ).update(status=status, note=note, finished_at=job.finished_at, duration=job.duration)
+    if finished and job.batch_id:
+        ScrapeBatch.record_job_finished(job.batch_id)
+        _queue_summary_if_finished(job.batch_id)
+    return job.duration
+
+def _queue_summary_if_finished(batch_id: int):
+    """Queues the batch's market summary once none of its jobs is still pending or running."""
+    unfinished = ScrapeJob.objects.filter(
+        batch_id=batch_id, status__in=[ScrapeJob.Status.PENDING, ScrapeJob.Status.RUNNING]
+    )
+    if not unfinished.exists():
+        generate_batch_summary.delay(batch_id)
+
+def _build_products(job, products_data):
+    """Unsaved Product rows for the scraped items, with prices parsed and URLs made absolute."""
+    products = []
+    base_url = job.category_url
+    now = timezone.now()
+
+    for item in products_data:
+        if job.max_items > 0 and len(products) >= job.max_items:
+            break
+        if not isinstance(item, dict): continue
+        
+        raw_price = item.get('price')
+        price_val = None
+        if raw_price:
+            num_match = re.search(r'(\d+[\d,.]*)', str(raw_price))
+            if num_match:
+                try:
+                    price_val = Decimal(num_match.group(1).replace(',', '')).quantize(Decimal('0.01'))
+                except: price_val = None
+
+        products.append(Product(
+            job=job,
+            batch_id=job.batch_id,
+            title=unicodedata.normalize('NFKC', str(item.get('title', 'No Title'))).strip()[:500],
+            price=price_val,
+            currency=item.get('currency', 'JOD'),
+            image_url=urljoin(base_url, str(item.get('image', '')).strip())[:500],
+            product_url=urljoin(base_url, str(item.get('product_url', '')).strip())[:500],
+            rating=item.get('rating'),
+            site=job.site,
+            scraped_at=now
+        ))
+    return products
+
+def _snapshot_entry(product):
+    return {"title": product.title, "price": None if product.price is None else str(product.price),
+            "currency": product.currency}
+
+def _persist_changes(job, products):
+    """
+    Scheduled runs: diffs the scrape against the schedule's previous snapshot,
+    stores only new, removed and re-priced products, and makes this scrape
+    the new snapshot. Returns a Counter of the stored changes by type.
+    The changes and the snapshot are written in one transaction, with the
+    schedule row locked so overlapping runs of a schedule diff one at a time.
+    """
+    with transaction.atomic():
+        schedule = ScrapeSchedule.objects.select_for_update().get(id=job.schedule_id)
+        changed, current = _diff_snapshot(job, schedule.snapshot or {}, products)
+        bulk_insert(Product, changed)
+        ScrapeSchedule.objects.filter(id=schedule.id).update(
+            snapshot={url: _snapshot_entry(p) for url, p in current.items()}
+        )
+    return Counter(p.change for p in changed)
+
+def _diff_snapshot(job, previous, products):
+    """The change rows of a scrape against the previous snapshot, and the scrape keyed by URL."""
+    current = {p.product_url: p for p in products}
+    if previous and not current:
+        # Most likely a broken page, not an emptied catalog: keep the snapshot
+        raise RuntimeError("Scrape returned no products; previous snapshot kept.")
+
+    changed = []
+    for url, product in current.items():
+        before = previous.get(url)
+        if before is None:
+            product.change = Product.Change.NEW
+        elif before["price"] != _snapshot_entry(product)["price"]:
+            product.change = Product.Change.PRICE_CHANGED
+            product.previous_price = before["price"]
+        else:
+            continue
+        changed.append(product)
+    for url in previous.keys() - current.keys():
+        before = previous[url]
+        changed.append(Product(
+            job=job, batch_id=job.batch_id, site=job.site, title=before["title"], price=before["price"],
+            currency=before["currency"], product_url=url, change=Product.Change.REMOVED,
+        ))
+    return changed, current
+
 @app.task(bind=True, max_retries=3, default_retry_delay=60)
 def run_ai_scrape_job(self, job_id: int):
     start_time = time.time()  
     job = None
     try:
         # 1. Initialize Job
-        job = ScrapeJob.objects.select_related('batch').get(id=job_id)
+        job = ScrapeJob.objects.get(id=job_id)
+        if job.status in (ScrapeJob.Status.DONE, ScrapeJob.Status.ERROR):
+            # acks_late redelivery of a job that already finished: its products and changes stand
+            logger.info(f"Job {job_id} already finished ({job.status}), skipping redelivery.")
+            return {'status': 'skipped', 'job_id': job_id}
         job.status = ScrapeJob.Status.RUNNING
         job.note = "Initializing scraper & checking policies..."
-        job.save(update_fields=["status", "note"])
-        
-        if job.batch:
-            job.batch.save()
+        job.started_at = timezone.now()
+        job.save(update_fields=["status", "note", "started_at"])
+        # acks_late: a job redelivered after a worker crash mid-scrape starts from a clean slate
+        Product.objects.filter(job=job).delete()
+        ScrapeBatch.record_products(job.batch_id, job.id, -job.product_count)
+        ScrapeBatch.publish_status(job.batch_id)
         
         api_key = os.getenv('GOOGLE_API_KEY')
         job_fields = getattr(job, 'fields', ['title', 'price', 'image', 'product_url'])
@@ -43,84 +166,127 @@ def run_ai_scrape_job(self, job_id: int):
         )
         
         # 3. Save Products to Database
-        created_count = 0
-        base_url = job.category_url
-
-        for item in products_data:
-            if job.max_items > 0 and created_count >= job.max_items:
-                break
-            if not isinstance(item, dict): continue
-            
-            raw_price = item.get('price')
-            price_val = None
-            if raw_price:
-                num_match = re.search(r'(\d+[\d,.]*)', str(raw_price))
-                if num_match:
-                    try:
-                        price_val = float(num_match.group(1).replace(',', ''))
-                    except: price_val = None
-
-            Product.objects.create(
-                job=job,
-                title=unicodedata.normalize('NFKC', str(item.get('title', 'No Title'))).strip(),
-                price=price_val,
-                currency=item.get('currency', 'JOD'),
-                image_url=urljoin(base_url, str(item.get('image', '')).strip())[:500],
-                product_url=urljoin(base_url, str(item.get('product_url', '')).strip())[:500],
-                rating=item.get('rating'),
-                site=job.site,
-                scraped_at=timezone.now()
-            )
-            created_count += 1
+        products = _build_products(job, products_data)
+        if job.schedule_id:
+            changes = _persist_changes(job, products)
+            created_count = sum(changes.values())
+            note = (f" Success! {len(products)} products, {created_count} changes saved "
+                    f"({changes[Product.Change.NEW]} new, {changes[Product.Change.REMOVED]} removed, "
+                    f"{changes[Product.Change.PRICE_CHANGED]} price changes).")
+        else:
+            bulk_insert(Product, products)
+            created_count = len(products)
+            note = f" Success! Saved {created_count} products."
+        ScrapeBatch.record_products(job.batch_id, job.id, created_count)
         
-        # 4. Market Analysis Phase - FIXED LOGIC
-        if created_count > 0 and job.batch:
-            job.note = "Generating AI Market Analysis..."
-            job.save(update_fields=["note"])
-            
-            batch_products = Product.objects.filter(job__batch=job.batch)
-            stats = compute_batch_stats(batch_products)
-            active_sites = list(batch_products.values_list('site', flat=True).distinct())
-            
-            analysis_text = summarize_batch(stats, job.batch.query, active_sites)
-            
-            #Assign to the object in memory 
-            job.batch.ai_summary = analysis_text
-
-        # 5. Finalize
-        job.status = ScrapeJob.Status.DONE
-        job.note = f" Success! Saved {created_count} products."
-        job.save(update_fields=["status", "note"])
-
-        # Calculate execution time
-        execution_time = time.time() - start_time
-        
-        if job.batch:
-            job.batch.duration = execution_time
-            job.batch.save()
+        # Price history: fold this scrape into the canonical catalog
+        try:
+            record_observations(products, job=job)
+        except Exception as e:
+            logger.error(f"Job {job_id}: price history update failed: {e}")
+
+        # 4. Finalize (the market analysis runs in generate_batch_summary)
+        execution_time = _finish_job(job, ScrapeJob.Status.DONE, note, start_time)
 
-        return {'status': 'success', 'job_id': job_id, 'products_count': created_count, 'duration': execution_time, 'ai_summary': job.batch.ai_summary}
+        return {'status': 'success', 'job_id': job_id, 'products_count': created_count, 'duration': execution_time}
+
+    except DomainBusy as e:
+        # The store already has its maximum of concurrent sessions: try again later
+        logger.info(f"Job {job_id} deferred: {e}")
+        if self.request.retries >= self.max_retries:
+            if job:
+                _finish_job(job, ScrapeJob.Status.ERROR, f"Error: {e}", start_time)
+            return {'status': 'error', 'job_id': job_id, 'reason': str(e)}
+        if job:
+            job.status = ScrapeJob.Status.PENDING
+            job.note = "Waiting for a free slot on this store..."
+            job.save(update_fields=["status", "note"])
+            ScrapeBatch.publish_status(job.batch_id)
+        raise self.retry(exc=e, countdown=getattr(settings, 'SCRAPE_DOMAIN_RETRY_S', 120))
 
     except PermissionError as e:
-        execution_time = time.time() - start_time
         logger.warning(f"Shielded: {e}")
         if job:
-            job.status = ScrapeJob.Status.ERROR
-            job.note = f"Policy Block: {str(e)}"
-            job.save(update_fields=["status", "note"])
-            if job.batch:
-                job.batch.duration = execution_time
-                job.batch.save()
+            _finish_job(job, ScrapeJob.Status.ERROR, f"Policy Block: {str(e)}", start_time)
         return {'status': 'blocked', 'reason': str(e)}
 
     except Exception as e:
-        execution_time = time.time() - start_time
         logger.error(f"Job {job_id} failed: {e}")
         if job:
-            job.status = ScrapeJob.Status.ERROR
-            job.note = f"Error: {str(e)[:200]}"
-            job.save(update_fields=["status", "note"])
-            if job.batch:
-                job.batch.duration = execution_time
-                job.batch.save()
-        raise e
\ No newline at end of file
+            _finish_job(job, ScrapeJob.Status.ERROR, f"Error: {str(e)[:200]}", start_time)
+        # Not re-raised: a failed job must not stop the jobs chained after it (see dispatch_batch_jobs)
+        return {'status': 'error', 'job_id': job_id, 'reason': str(e)}
+
+def dispatch_batch_jobs(jobs):
+    """
+    Queues a batch's jobs as one Celery group so different stores are scraped
+    in parallel. Jobs on the same domain are spread over at most
+    SCRAPE_MAX_JOBS_PER_DOMAIN chains, so a batch never opens more than that
+    many concurrent sessions against one store.
+    """
+    cap = max(1, getattr(settings, 'SCRAPE_MAX_JOBS_PER_DOMAIN', 2))
+    by_domain = defaultdict(list)
+    for job in jobs:
+        by_domain[domain_of(job.category_url)].append(job.id)
+
+    lanes = []
+    for job_ids in by_domain.values():
+        for lane in range(min(cap, len(job_ids))):
+            lanes.append(job_ids[lane::cap])
+
+    signatures = [
+        chain(run_ai_scrape_job.si(job_id) for job_id in lane) if len(lane) > 1 else run_ai_scrape_job.si(lane[0])
+        for lane in lanes
+    ]
+    logger.info(f"Dispatching {sum(len(l) for l in lanes)} jobs over {len(by_domain)} domains in {len(lanes)} lanes.")
+    return group(signatures).apply_async()
+
+@app.task(bind=True, max_retries=3, default_retry_delay=30)
+def generate_batch_summary(self, batch_id: int):
+    """
+    AI market summary of a whole batch, routed to the 'llm' queue so scraping
+    workers never wait on the model. Safe to run more than once per batch:
+    identical stats are answered from the LLM response cache.
+    """
+    batch = ScrapeBatch.objects.get(id=batch_id)
+    # Scheduled runs store changes only: summarize the new and re-priced listings, not removed ones
+    batch_products = Product.objects.filter(batch=batch).exclude(change=Product.Change.REMOVED)
+    stats = compute_batch_stats(batch_products)
+    active_sites = list(batch_products.values_list('site', flat=True).distinct())
+    query = batch.query
+    if batch.scrapejob_set.filter(schedule__isnull=False).exists():
+        query = f"{query} (change report: new and re-priced products since the previous run)"
+
+    try:
+        analysis_text = summarize_batch(stats, query, active_sites, raise_errors=True)
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e)
+        analysis_text = f"Summary generation failed, but {stats.get('count')} items were processed."
+
+    ScrapeBatch.objects.filter(id=batch_id).update(ai_summary=analysis_text)
+    ScrapeBatch.publish_status(batch_id)
+    logger.info(f"Batch {batch_id}: AI summary saved ({stats.get('count', 0)} products).")
+    return {'status': 'success', 'batch_id': batch_id}
+
+@app.task
+def run_due_schedules():
+    """
+    Celery beat entry point (CELERY_BEAT_SCHEDULE): queues one scrape job for
+    every enabled schedule whose next run is due.
+    """
+    now = timezone.now()
+    queued = 0
+    for schedule in ScrapeSchedule.objects.filter(enabled=True, next_run_at__lte=now):
+        # Claim the run by moving next_run_at, so overlapping beats never queue it twice
+        claimed = ScrapeSchedule.objects.filter(id=schedule.id, next_run_at=schedule.next_run_at).update(
+            next_run_at=now + timedelta(hours=schedule.interval_hours), last_run_at=now
+        )
+        if not claimed:
+            continue
+        job = schedule.start_job()
+        run_ai_scrape_job.delay(job.id)
+        queued += 1
+    if queued:
+        logger.info(f"Queued {queued} scheduled scrape(s).")
+    return {'queued': queued}
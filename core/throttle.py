@@ -0,0 +1,317 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlparse
+from django.conf import settings
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "basira:domain"
+
+# Token bucket with reservation: the token is always taken and the caller is
+# told how long to wait for it, so concurrent callers queue up fairly.
+# Uses the Redis server clock so workers on different hosts agree.
+_RESERVE_TOKEN = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate) - 1
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+if tokens >= 0 then return '0' end
+return tostring(-tokens / rate)
+"""
+
+# Counting semaphore as a sorted set of holders scored by lease expiry, so
+# slots held by a crashed worker free themselves after the TTL.
+_ACQUIRE_SLOT = """
+local limit = tonumber(ARGV[1])
+local ttl = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) < limit then
+    redis.call('ZADD', KEYS[1], now + ttl, ARGV[3])
+    redis.call('EXPIRE', KEYS[1], math.ceil(ttl))
+    return 1
+end
+return 0
+"""
+
+# Extends a held lease; a holder whose lease already expired is not re-added.
+_RENEW_SLOT = """
+local ttl = tonumber(ARGV[1])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local expires = tonumber(redis.call('ZSCORE', KEYS[1], ARGV[2]))
+if not expires or expires <= now then return 0 end
+redis.call('ZADD', KEYS[1], now + ttl, ARGV[2])
+redis.call('EXPIRE', KEYS[1], math.ceil(ttl))
+return 1
+"""
+
+class DomainBusy(RuntimeError):
+    """Raised when no concurrency slot for a domain frees up in time."""
+
+def domain_of(url: str) -> str:
+    """
+    Reduces a URL (or bare host) to a lowercase host without scheme, port or
+    'www.'. The key for per-site throttling and ScrapeSource resolution.
+    """
+    if not url:
+        return ""
+    host = (urlparse(url if '://' in url else f"//{url}").hostname or "").lower().rstrip('.')
+    return host[4:] if host.startswith('www.') else host
+
+class RedisBackend:
+    """Shared across all workers that point at the same Redis."""
+
+    def __init__(self, client):
+        self.client = client
+        self._reserve = client.register_script(_RESERVE_TOKEN)
+        self._acquire = client.register_script(_ACQUIRE_SLOT)
+        self._renew = client.register_script(_RENEW_SLOT)
+
+    def reserve_token(self, domain, rate, burst):
+        return float(self._reserve(keys=[f"{KEY_PREFIX}:bucket:{domain}"], args=[rate, burst]))
+
+    def try_acquire(self, domain, limit, ttl, holder):
+        return bool(self._acquire(keys=[f"{KEY_PREFIX}:slots:{domain}"], args=[limit, ttl, holder]))
+
+    def renew(self, domain, ttl, holder):
+        return bool(self._renew(keys=[f"{KEY_PREFIX}:slots:{domain}"], args=[ttl, holder]))
+
+    def release(self, domain, holder):
+        self.client.zrem(f"{KEY_PREFIX}:slots:{domain}", holder)
+
+class LocalBackend:
+    """In-process fallback with the same semantics; only limits this worker process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._slots = {}
+
+    def reserve_token(self, domain, rate, burst):
+        with self._lock:
+            now = time.monotonic()
+            tokens, ts = self._buckets.get(domain, (burst, now))
+            tokens = min(burst, tokens + (now - ts) * rate) - 1
+            self._buckets[domain] = (tokens, now)
+            return 0.0 if tokens >= 0 else -tokens / rate
+
+    def try_acquire(self, domain, limit, ttl, holder):
+        with self._lock:
+            now = time.monotonic()
+            holders = {h: exp for h, exp in self._slots.get(domain, {}).items() if exp > now}
+            acquired = len(holders) < limit
+            if acquired:
+                holders[holder] = now + ttl
+            self._slots[domain] = holders
+            return acquired
+
+    def renew(self, domain, ttl, holder):
+        with self._lock:
+            now = time.monotonic()
+            holders = self._slots.get(domain, {})
+            if holders.get(holder, 0) <= now:
+                return False
+            holders[holder] = now + ttl
+            return True
+
+    def release(self, domain, holder):
+        with self._lock:
+            self._slots.get(domain, {}).pop(holder, None)
+
+class FailoverBackend:
+    """
+    Redis, falling back to a LocalBackend per call: a Redis error switches this
+    process to local limits for SCRAPE_THROTTLE_REDIS_RETRY_S, after which
+    Redis is tried again.
+    """
+
+    def __init__(self, redis_backend):
+        self.redis = redis_backend
+        self.local = LocalBackend()
+        self._down_until = 0.0
+
+    def _call(self, method, *args):
+        if time.monotonic() >= self._down_until:
+            try:
+                return getattr(self.redis, method)(*args)
+            except redis.RedisError as e:
+                retry = getattr(settings, 'SCRAPE_THROTTLE_REDIS_RETRY_S', 30)
+                self._down_until = time.monotonic() + retry
+                logger.warning(f"Domain throttling: Redis unavailable ({e}), limits apply per process only "
+                               f"for the next {retry}s.")
+        return getattr(self.local, method)(*args)
+
+    def reserve_token(self, domain, rate, burst):
+        return self._call('reserve_token', domain, rate, burst)
+
+    def try_acquire(self, domain, limit, ttl, holder):
+        return self._call('try_acquire', domain, limit, ttl, holder)
+
+    def renew(self, domain, ttl, holder):
+        # The slot may have been taken from either backend
+        return self._call('renew', domain, ttl, holder) or self.local.renew(domain, ttl, holder)
+
+    def release(self, domain, holder):
+        self.local.release(domain, holder)
+        self._call('release', domain, holder)
+
+class DomainGovernor:
+    """
+    Per-domain politeness for every scraper: throttle() spaces out requests
+    with a token bucket (SCRAPE_DOMAIN_RATE_PER_S, SCRAPE_DOMAIN_BURST) and
+    slot() caps concurrent sessions (SCRAPE_DOMAIN_CONCURRENCY). Each has an
+    asyncio variant for the Playwright scraper. A held slot's lease
+    (SCRAPE_DOMAIN_SLOT_TTL_S) is renewed every third of the TTL, so it only
+    lapses when its holder dies.
+    """
+    POLL_S = 1.0
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @staticmethod
+    def _limits():
+        return (
+            max(0.001, getattr(settings, 'SCRAPE_DOMAIN_RATE_PER_S', 0.5)),
+            max(1, getattr(settings, 'SCRAPE_DOMAIN_BURST', 3)),
+            max(1, getattr(settings, 'SCRAPE_DOMAIN_CONCURRENCY', 2)),
+            getattr(settings, 'SCRAPE_DOMAIN_SLOT_TTL_S', 1800),
+            getattr(settings, 'SCRAPE_DOMAIN_SLOT_WAIT_S', 300),
+        )
+
+    def _reserve(self, url):
+        rate, burst, *_ = self._limits()
+        domain = domain_of(url)
+        wait = self.backend.reserve_token(domain, rate, burst)
+        if wait > 0:
+            logger.info(f"Throttling {domain}: waiting {wait:.1f}s")
+        return wait
+
+    def throttle(self, url):
+        """Blocks until the next request to url's domain is allowed."""
+        wait = self._reserve(url)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def athrottle(self, url):
+        # Backend calls may be Redis round trips: run them off the event loop
+        wait = await asyncio.to_thread(self._reserve, url)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def _try_acquire(self, domain, holder):
+        _, _, limit, ttl, _ = self._limits()
+        return self.backend.try_acquire(domain, limit, ttl, holder)
+
+    @contextmanager
+    def slot(self, url, wait=None):
+        """
+        Holds one of the domain's concurrency slots, waiting up to wait seconds
+        (default SCRAPE_DOMAIN_SLOT_WAIT_S; 0 fails at once with DomainBusy,
+        for tasks that retry later rather than block their worker).
+        """
+        domain, holder = domain_of(url), uuid.uuid4().hex
+        deadline = time.monotonic() + (self._limits()[4] if wait is None else wait)
+        while not self._try_acquire(domain, holder):
+            if time.monotonic() >= deadline:
+                raise DomainBusy(f"No free scraping slot for {domain}")
+            time.sleep(self.POLL_S)
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(domain, holder, stop), daemon=True)
+        heartbeat.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            heartbeat.join()
+            self.backend.release(domain, holder)
+
+    @asynccontextmanager
+    async def aslot(self, url, wait=None):
+        domain, holder = domain_of(url), uuid.uuid4().hex
+        deadline = time.monotonic() + (self._limits()[4] if wait is None else wait)
+        while not await asyncio.to_thread(self._try_acquire, domain, holder):
+            if time.monotonic() >= deadline:
+                raise DomainBusy(f"No free scraping slot for {domain}")
+            await asyncio.sleep(self.POLL_S)
+        heartbeat = asyncio.create_task(self._aheartbeat(domain, holder))
+        try:
+            yield
+        finally:
+            heartbeat.cancel()
+            await asyncio.to_thread(self.backend.release, domain, holder)
+
+    def _renew(self, domain, holder, ttl):
+        try:
+            renewed = self.backend.renew(domain, ttl, holder)
+        except Exception as e:
+            logger.warning(f"Could not renew the scraping slot for {domain}: {e}")
+            return
+        if not renewed:
+            logger.warning(f"Scraping slot for {domain} expired before it was renewed")
+
+    def _heartbeat(self, domain, holder, stop):
+        ttl = self._limits()[3]
+        while not stop.wait(ttl / 3):
+            self._renew(domain, holder, ttl)
+
+    async def _aheartbeat(self, domain, holder):
+        ttl = self._limits()[3]
+        while True:
+            await asyncio.sleep(ttl / 3)
+            await asyncio.to_thread(self._renew, domain, holder, ttl)
+
+_GOVERNOR = None
+_GOVERNOR_LOCK = threading.Lock()
+
+def _make_backend():
+    choice = getattr(settings, 'SCRAPE_THROTTLE_BACKEND', 'auto')
+    if choice != 'local' and redis is not None:
+        url = getattr(settings, 'SCRAPE_THROTTLE_REDIS_URL', None) or getattr(settings, 'CELERY_BROKER_URL', None)
+        try:
+            client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+            if choice == 'redis':
+                client.ping()
+                logger.info("Domain throttling: Redis backend.")
+                return RedisBackend(client)
+            # Availability is checked on every call, so an outage or a late Redis start is picked up
+            logger.info("Domain throttling: Redis backend with per-process fallback.")
+            return FailoverBackend(RedisBackend(client))
+        except Exception as e:
+            if choice == 'redis':
+                raise
+            logger.warning(f"Domain throttling: Redis unusable ({e}), limits apply per process only.")
+    return LocalBackend()
+
+def get_governor():
+    """The process-wide DomainGovernor (Redis-backed when reachable)."""
+    global _GOVERNOR
+    with _GOVERNOR_LOCK:
+        if _GOVERNOR is None:
+            _GOVERNOR = DomainGovernor(_make_backend())
+        return _GOVERNOR
+
+def reset():
+    """Forgets the governor so the next call re-reads settings (tests)."""
+    global _GOVERNOR
+    with _GOVERNOR_LOCK:
+        _GOVERNOR = None
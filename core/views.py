@@ -1,16 +1,22 @@
 import logging
 import csv
 import json
+from datetime import timedelta
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login
-from django.db.models import Count
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Exists, OuterRef, Q, Subquery
+from django.utils import timezone
 
 from .forms import RegisterForm
-from .models import ScrapeBatch, ScrapeJob, Product, Site
+from .models import ScrapeBatch, ScrapeJob, ScrapeSchedule, Product, Site, CanonicalProduct, PriceObservation
 from .analytics import compute_batch_stats
-from .tasks import run_ai_scrape_job
+from .catalog import normalize_product_url
+from .tasks import run_ai_scrape_job, dispatch_batch_jobs
+from webscraper.status import status_response
 
 logger = logging.getLogger(__name__)
 
@@ -34,16 +40,31 @@ def register_view(request):
 
 # --- App Views ---
 
+def _requested_urls(request):
+    """
+    The category URLs of a scrape request: the main 'category_url' plus any
+    'category_urls' (repeated fields or one URL per line), de-duplicated in order.
+    """
+    raw = [request.POST.get("category_url", "")]
+    for value in request.POST.getlist("category_urls"):
+        raw.extend(value.splitlines())
+    urls = []
+    for url in (u.strip() for u in raw):
+        if url and url not in urls:
+            urls.append(url)
+    return urls[:getattr(settings, 'SCRAPE_MAX_URLS_PER_BATCH', 10)]
+
 @login_required
 def scrape(request):
     if request.method == "POST":
-        category_url = request.POST.get("category_url", "").strip()
+        category_urls = _requested_urls(request)
         
         # --- NEW: Robots.txt Compliance Validation ---
         from .selector_detector import PlaywrightScraper  # Import your scraper class
         scraper_tool = PlaywrightScraper()
         
-        if category_url and not scraper_tool.can_scrape(category_url):
+        blocked = [url for url in category_urls if not scraper_tool.can_scrape(url)]
+        if blocked:
             pagination_choices = [
                 ('single', 'Single Page Only'),
                 ('next', 'Next Button Pagination'),
@@ -51,7 +72,8 @@ def scrape(request):
                 ('auto', 'Auto-Detect (Recommended)'),
             ]
             return render(request, "core/scrape.html", {
-                "error": "Access Denied: This website does not allow automated scraping (robots.txt restriction).",
+                "error": "Access Denied: This website does not allow automated scraping (robots.txt restriction): "
+                         + ", ".join(blocked),
                 "defaults": {"max_items": 50, "max_pages": 1},
                 "pagination_choices": pagination_choices
             })
@@ -85,27 +107,53 @@ def scrape(request):
         except (ValueError, TypeError):
             max_pages = 1
             
-        if not category_url:
+        if not category_urls:
             return render(request, "core/scrape.html", {"error": "Category URL is required"})
 
-        site = Site.DUMYAH if "dumyah.com" in category_url else Site.OTHER
-        
-        # Create Batch and Job
-        batch = ScrapeBatch.objects.create(user=request.user, query=category_url) 
-        job = ScrapeJob.objects.create(
-            batch=batch,
-            site=site,
-            status=ScrapeJob.Status.PENDING,
-            category_url=category_url,
-            fields=scraper_fields,
-            max_items=max_items,
-            max_pages=max_pages,
-            pagination_type=pagination_type 
-        )
+        # Optional recurring schedule: later runs are queued by Celery beat and store only changes
+        try:
+            repeat_hours = max(0, int(request.POST.get("repeat_hours") or 0))
+        except (ValueError, TypeError):
+            repeat_hours = 0
+        schedules = {}
+        if repeat_hours:
+            for category_url in category_urls:
+                schedules[category_url] = ScrapeSchedule.objects.create(
+                    user=request.user,
+                    category_url=category_url,
+                    site=Site.DUMYAH if "dumyah.com" in category_url else Site.OTHER,
+                    fields=scraper_fields,
+                    max_items=max_items,
+                    max_pages=max_pages,
+                    pagination_type=pagination_type,
+                    interval_hours=repeat_hours,
+                    next_run_at=timezone.now() + timedelta(hours=repeat_hours),
+                    last_run_at=timezone.now(),
+                )
+
+        # Create Batch and one Job per URL
+        batch = ScrapeBatch.objects.create(user=request.user, query=category_urls[0][:200], job_count=len(category_urls))
+        jobs = [
+            ScrapeJob.objects.create(
+                batch=batch,
+                schedule=schedules.get(category_url),
+                site=Site.DUMYAH if "dumyah.com" in category_url else Site.OTHER,
+                status=ScrapeJob.Status.PENDING,
+                category_url=category_url,
+                fields=scraper_fields,
+                max_items=max_items,
+                max_pages=max_pages,
+                pagination_type=pagination_type 
+            )
+            for category_url in category_urls
+        ]
 
-        # Enqueue the background task
-        run_ai_scrape_job.delay(job.id)
-        logger.info(f"Job {job.id} enqueued for Batch {batch.id}")
+        # Enqueue the background task(s)
+        if len(jobs) == 1:
+            run_ai_scrape_job.delay(jobs[0].id)
+        else:
+            dispatch_batch_jobs(jobs)
+        logger.info(f"{len(jobs)} job(s) enqueued for Batch {batch.id}")
 
         return redirect("dashboard", batch_id=batch.id)
 
@@ -123,25 +171,57 @@ def scrape(request):
 
 @login_required
 def history(request):
-    # Fetch batches fresh and ensure 'duration' is included
-    batches = ScrapeBatch.objects.filter(user=request.user).order_by("-created_at")[:30]
-    
-    # Annotate and Prefetch as you were doing
-    batches = batches.annotate(
-        count=Count('scrapejob_set__products')
-    ).prefetch_related('scrapejob_set')
-    
-    return render(request, "core/history.html", {"batches": batches})
+    """
+    The user's 30 latest batches: one query on the (user, -created_at) index
+    using the stored product/job counts, cached per user until one of their
+    batches is created or finishes a job (HISTORY_CACHE_TTL_S at most).
+    """
+    key = ScrapeBatch.history_cache_key(request.user.id)
+    batches = cache.get(key)
+    if batches is None:
+        first_job = ScrapeJob.objects.filter(batch=OuterRef('pk')).order_by('id').values('status')[:1]
+        batches = list(
+            ScrapeBatch.objects.filter(user=request.user).order_by("-created_at")
+            .annotate(status=Subquery(first_job))
+            .values("id", "query", "created_at", "duration", "product_count", "job_count", "status")[:30]
+        )
+        cache.set(key, batches, getattr(settings, 'HISTORY_CACHE_TTL_S', 60))
+
+    schedules = ScrapeSchedule.objects.filter(user=request.user).order_by("-created_at")
+    return render(request, "core/history.html", {"batches": batches, "schedules": schedules})
+
+@login_required
+def toggle_schedule(request, schedule_id):
+    """Pauses or resumes one of the user's recurring scrapes (POST)."""
+    schedule = get_object_or_404(ScrapeSchedule, id=schedule_id, user=request.user)
+    if request.method == "POST":
+        schedule.enabled = not schedule.enabled
+        schedule.save(update_fields=["enabled"])
+        logger.info(f"Schedule {schedule.id} {'resumed' if schedule.enabled else 'paused'} by user {request.user.id}")
+    return redirect("history")
+
+@login_required
+def delete_schedule(request, schedule_id):
+    """Deletes one of the user's recurring scrapes (POST); batches it already produced are kept."""
+    schedule = get_object_or_404(ScrapeSchedule, id=schedule_id, user=request.user)
+    if request.method == "POST":
+        schedule.delete()
+    return redirect("history")
 
 @login_required
 def dashboard(request, batch_id):
     try:
         # Fetch the batch and its products
         batch = get_object_or_404(ScrapeBatch, id=batch_id, user=request.user)
-        products = Product.objects.filter(job__batch=batch).order_by('-scraped_at')
+        products = Product.objects.filter(batch=batch).order_by('-scraped_at')
         
-        # Compute analytics
-        stats = compute_batch_stats(products)
+        # Compute analytics (REMOVED rows of scheduled runs are no longer listed)
+        stats = compute_batch_stats(products.exclude(change=Product.Change.REMOVED))
+
+        # Per-store comparison for multi-URL batches, over the same rows as the stats
+        store_jobs = batch.scrapejob_set.annotate(
+            avg_price=Avg('products__price', filter=~Q(products__change=Product.Change.REMOVED))
+        ).order_by('id')
         
         # Chart Data Preparation
         chart_products = list(products[:50])
@@ -169,6 +249,7 @@ def dashboard(request, batch_id):
         return render(request, "core/dashboard.html", {
             "batch": batch,  # Template now accesses batch.ai_summary
             "stats": stats,
+            "store_jobs": store_jobs,
             "products": chart_products,
             "chart_labels": json.dumps(chart_labels),
             "chart_prices": json.dumps(chart_prices),
@@ -179,14 +260,63 @@ def dashboard(request, batch_id):
         logger.error(f"Dashboard error for batch {batch_id}: {e}", exc_info=True)
         return render(request, "core/dashboard.html", {"error": str(e)})
 
+async def job_status(request, batch_id):
+    """
+    Polled by the dashboard. Served from the status the tasks publish to the
+    cache (no batch or job queries), with ETag/304 and ?wait=N long-polling,
+    see webscraper.status.status_response (which also checks the login).
+    """
+    return await status_response(request, 'batch', batch_id, ScrapeBatch.publish_status)
+
+def _price_point(observed_at, price):
+    return observed_at, float(price) if price is not None else None
+
 @login_required
-def job_status(request, batch_id):
-    batch = get_object_or_404(ScrapeBatch, id=batch_id, user=request.user)
-    # Fetch all jobs for this batch, latest first
-    jobs = list(ScrapeJob.objects.filter(batch=batch).order_by('-id').values(
-        "id", "status", "note"
-    ))
-    return JsonResponse({"jobs": jobs})
+def price_history(request):
+    """
+    Price series of one product across every scrape, looked up by its URL
+    (?url=..., optionally ?days=N). Only products the user has scraped are
+    found: one with an observation from their jobs, or whose URL is one of
+    their stored products. Reads only that product's observations through
+    the (product, observed_at) index, however many batches exist.
+    """
+    url = request.GET.get("url", "")
+    observed_by_user = PriceObservation.objects.filter(product=OuterRef("pk"), job__batch__user=request.user)
+    scraped_by_user = Product.objects.filter(batch__user=request.user, product_url=url)
+    product = (CanonicalProduct.objects.filter(url_key=normalize_product_url(url))
+               .filter(Exists(observed_by_user) | Exists(scraped_by_user))
+               .order_by("-last_seen_at").first())
+    if product is None:
+        raise Http404("No price history for this product yet.")
+
+    observations = product.observations.order_by("observed_at")
+    try:
+        days = int(request.GET.get("days") or 0)
+    except ValueError:
+        days = 0
+    in_effect = None
+    if days > 0:
+        cutoff = timezone.now() - timedelta(days=days)
+        # The price in effect when the window opens, drawn from the window start
+        in_effect = (product.observations.filter(observed_at__lt=cutoff).order_by("-observed_at")
+                     .values_list("observed_at", "price").first())
+        observations = observations.filter(observed_at__gte=cutoff)
+
+    points = [_price_point(observed_at, price) for observed_at, price in observations.values_list("observed_at", "price")]
+    observation_count = len(points)
+    if in_effect:
+        points.insert(0, _price_point(cutoff, in_effect[1]))
+    # The series only changes at observations: carry the last price up to the last time it was seen
+    if points and points[-1][0] < product.last_seen_at:
+        points.append((product.last_seen_at, points[-1][1]))
+
+    return render(request, "core/price_history.html", {
+        "product": product,
+        "days": days,
+        "observation_count": observation_count,
+        "chart_labels": json.dumps([timezone.localtime(t).strftime("%Y-%m-%d %H:%M") for t, _ in points]),
+        "chart_prices": json.dumps([p for _, p in points]),
+    })
 
 # --- Export Views ---
 
@@ -196,10 +326,11 @@ def export_csv(request, batch_id):
     batch = get_object_or_404(ScrapeBatch, id=batch_id, user=request.user)
     
     # Fetch products associated with this batch
-    products = Product.objects.filter(job__batch=batch).order_by("site", "title")
+    products = Product.objects.filter(batch=batch).order_by("site", "title")
     
     # Define columns for the CSV
-    potential_fields = ["title", "price", "currency", "product_url", "image_url", "site", "search_query", "scraped_at"]
+    potential_fields = ["title", "price", "currency", "product_url", "image_url", "site", "search_query", "scraped_at",
+                        "change", "previous_price"]
 
     response = HttpResponse(content_type="text/csv")
     response["Content-Disposition"] = f'attachment; filename="basira_batch_{batch_id}.csv"'
@@ -226,10 +357,13 @@ def export_csv(request, batch_id):
 @login_required
 def export_json(request, batch_id):
     batch = get_object_or_404(ScrapeBatch, id=batch_id, user=request.user)
-    products = Product.objects.filter(job__batch=batch)
+    products = Product.objects.filter(batch=batch)
     
-    potential_fields = ["title", "price", "currency", "product_url", "image_url", "site", "search_query", "rating", "scraped_at"]
-    active_fields = [f for f in potential_fields if products.exclude(**{f"{f}__isnull": True}).exists()]
+    potential_fields = ["title", "price", "currency", "product_url", "image_url", "site", "search_query", "rating", "scraped_at",
+                        "change", "previous_price"]
+    # change is blank rather than null outside scheduled runs
+    active_fields = [f for f in potential_fields
+                     if products.exclude(**{f"{f}__isnull": True}).exclude(**({f: ""} if f == "change" else {})).exists()]
     
     items = list(products.values(*active_fields))
     return JsonResponse(items, safe=False)
\ No newline at end of file
@@ -0,0 +1,328 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+# Use the new google.genai client
+try:
+    import httpx
+    from google import genai as _genai
+    from google.genai import types as _types
+except Exception:
+    _genai = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+# Rough chars-per-token ratio used when the API does not report usage
+CHARS_PER_TOKEN = 4
+
+# One client per API key for the whole process: the underlying httpx pool
+# keeps connections to the API open between calls.
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+_SEMAPHORE = None
+_SEMAPHORE_LOCK = threading.Lock()
+
+# purpose -> running totals, reported by get_metrics()
+_METRICS = defaultdict(lambda: {
+    "calls": 0, "errors": 0, "latency_s": 0.0, "prompt_tokens": 0, "output_tokens": 0,
+    "cache_hits": 0, "cache_misses": 0,
+})
+_METRICS_LOCK = threading.Lock()
+
+class LLMUnavailable(RuntimeError):
+    """Raised when no client can be built (SDK missing or no API key)."""
+
+def _max_concurrency():
+    return max(1, getattr(settings, 'LLM_MAX_CONCURRENCY', 8))
+
+def _semaphore():
+    global _SEMAPHORE
+    with _SEMAPHORE_LOCK:
+        if _SEMAPHORE is None:
+            _SEMAPHORE = threading.BoundedSemaphore(_max_concurrency())
+        return _SEMAPHORE
+
+def get_client(api_key=None):
+    """
+    Returns the shared google.genai client for api_key (defaults to
+    GOOGLE_API_KEY), creating it on first use with the configured timeout
+    and connection pool size.
+    """
+    api_key = api_key or getattr(settings, 'GOOGLE_API_KEY', None)
+    if _genai is None:
+        raise LLMUnavailable("google-genai is not installed. Install it with `pip install google-genai`.")
+    if not api_key:
+        raise LLMUnavailable("No API key configured.")
+
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(api_key)
+        if client is None:
+            pool_size = _max_concurrency()
+            client = _genai.Client(api_key=api_key, http_options=_types.HttpOptions(
+                timeout=int(getattr(settings, 'LLM_TIMEOUT_S', 60) * 1000),  # milliseconds
+                client_args={'limits': httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)},
+            ))
+            _CLIENTS[api_key] = client
+            logger.info("google.genai client initialized.")
+        return client
+
+def estimate_tokens(text):
+    return max(1, len(text or "") // CHARS_PER_TOKEN)
+
+def response_text(resp):
+    """Text of a response, falling back to joining the first candidate's parts."""
+    try:
+        return (resp.text or "").strip()
+    except Exception:
+        try:
+            parts = [p.text for p in resp.candidates[0].content.parts if getattr(p, 'text', None)]
+            return "\n".join(parts).strip()
+        except Exception:
+            return ""
+
+# --- Backends ---
+# A backend turns (model, contents, config, api_key) into a response exposing
+# .text and .usage_metadata, like the google.genai SDK. LLM_BACKEND selects
+# 'gemini' (default), 'fake', or a dotted path to another backend class.
+
+class GeminiBackend:
+    """Calls the Gemini API through the shared per-key client."""
+
+    def check(self, api_key):
+        get_client(api_key)
+
+    def generate(self, model, contents, config, api_key):
+        return get_client(api_key).models.generate_content(model=model, contents=contents, config=config)
+
+    def generate_stream(self, model, contents, config, api_key):
+        return get_client(api_key).models.generate_content_stream(model=model, contents=contents, config=config)
+
+class FakeBackend:
+    """
+    Deterministic offline stand-in for benchmarks and tests: the same prompt
+    always gets the same answer, after LLM_FAKE_LATENCY_S of simulated latency.
+    Selector prompts get a JSON selector map, everything else a bullet summary.
+    """
+    SELECTORS = {
+        "product_container": ".product-card",
+        "title": ".product-title",
+        "price": ".price",
+        "image": "img",
+        "product_url": "a.product-link",
+    }
+
+    def check(self, api_key):
+        return None
+
+    def _wait(self):
+        latency = getattr(settings, 'LLM_FAKE_LATENCY_S', 0.0)
+        if latency > 0:
+            time.sleep(latency)
+
+    def _text(self, contents):
+        prompt = contents if isinstance(contents, str) else json.dumps(contents, sort_keys=True, default=str)
+        if "CSS selectors" in prompt:
+            return json.dumps(self.SELECTORS)
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8]
+        return "\n".join([
+            f"\u2022 Offline response {digest}: {estimate_tokens(prompt)} prompt tokens received.",
+            "\u2022 Themes, tone and entities are placeholders generated without the API.",
+            "\u2022 Use LLM_BACKEND=gemini for real analysis.",
+        ])
+
+    def _response(self, text):
+        return SimpleNamespace(text=text, usage_metadata=None)
+
+    def generate(self, model, contents, config, api_key):
+        self._wait()
+        return self._response(self._text(contents))
+
+    def generate_stream(self, model, contents, config, api_key):
+        self._wait()
+        for line in self._text(contents).splitlines(keepends=True):
+            yield self._response(line)
+
+BACKENDS = {
+    'gemini': GeminiBackend,
+    'fake': FakeBackend,
+}
+_BACKEND_INSTANCES = {}
+
+def get_backend():
+    """The backend selected by LLM_BACKEND (instances are reused per process)."""
+    name = getattr(settings, 'LLM_BACKEND', 'gemini')
+    backend = _BACKEND_INSTANCES.get(name)
+    if backend is None:
+        backend_class = BACKENDS.get(name) or import_string(name)
+        backend = _BACKEND_INSTANCES.setdefault(name, backend_class())
+    return backend
+
+def check_available(api_key=None):
+    """Raises LLMUnavailable when the active backend cannot serve calls."""
+    get_backend().check(api_key)
+
+def is_available(api_key=None):
+    try:
+        check_available(api_key)
+        return True
+    except LLMUnavailable:
+        return False
+
+# --- Response cache ---
+
+def _cache_key(model, config, contents):
+    """SHA-256 over model + config + prompt: byte-identical requests share a key."""
+    if hasattr(config, 'model_dump'):
+        config = config.model_dump(exclude_none=True, mode='json')
+    payload = json.dumps([model, config, contents], sort_keys=True, default=str, ensure_ascii=False)
+    return "llm:" + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _response_cache():
+    """The cache configured for LLM responses, or None when caching is off."""
+    if not getattr(settings, 'LLM_CACHE_ENABLED', True):
+        return None
+    return caches[getattr(settings, 'LLM_CACHE_ALIAS', 'llm')]
+
+def _cache_get(key):
+    cache = _response_cache()
+    if cache is None:
+        return None
+    try:
+        return cache.get(key)
+    except Exception as e:
+        # e.g. cache table not created yet: behave as a miss
+        logger.warning(f"LLM cache read failed: {e}")
+        return None
+
+def _cache_set(key, value):
+    cache = _response_cache()
+    if cache is None:
+        return
+    try:
+        cache.set(key, value, timeout=getattr(settings, 'LLM_CACHE_TTL_S', 7 * 24 * 3600))
+    except Exception as e:
+        logger.warning(f"LLM cache write failed: {e}")
+
+def _count_cache(purpose, hit):
+    with _METRICS_LOCK:
+        _METRICS[purpose]["cache_hits" if hit else "cache_misses"] += 1
+
+def _record(purpose, call):
+    with _METRICS_LOCK:
+        totals = _METRICS[purpose]
+        totals["calls"] += 1
+        totals["errors"] += 1 if "error" in call else 0
+        totals["latency_s"] += call["latency_s"]
+        totals["prompt_tokens"] += call.get("prompt_tokens", 0)
+        totals["output_tokens"] += call.get("output_tokens", 0)
+    logger.info(
+        f"LLM call [{purpose}] {call['model']}: {call['latency_s']}s, "
+        f"{call.get('prompt_tokens', 0)}+{call.get('output_tokens', 0)} tokens"
+        + (f", error: {call['error']}" if "error" in call else "")
+    )
+
+def generate(contents, model=None, config=None, api_key=None, purpose="default", cache=False):
+    """
+    Runs one generation through the active backend and returns (text, call)
+    where call carries the model, latency and token usage (from
+    usage_metadata when the API reports it, else estimated).
+    At most LLM_MAX_CONCURRENCY calls run at once per process.
+
+    With cache=True, a byte-identical earlier request (same model, config and
+    prompt) within LLM_CACHE_TTL_S is answered from the response cache
+    without calling the API; such calls are marked "cached" and cost no tokens.
+    """
+    model = model or DEFAULT_MODEL
+    key = _cache_key(model, config, contents) if cache and _response_cache() is not None else None
+    if key:
+        started = time.monotonic()
+        text = _cache_get(key)
+        _count_cache(purpose, text is not None)
+        if text is not None:
+            return text, {"model": model, "cached": True, "latency_s": round(time.monotonic() - started, 2),
+                          "prompt_tokens": 0, "output_tokens": 0}
+
+    backend = get_backend()
+    backend.check(api_key)
+    started = time.monotonic()
+    call = {"model": model}
+    try:
+        with _semaphore():
+            resp = backend.generate(model, contents, config, api_key)
+        text = response_text(resp)
+        usage = getattr(resp, 'usage_metadata', None)
+        call["prompt_tokens"] = getattr(usage, 'prompt_token_count', None) or estimate_tokens(str(contents))
+        call["output_tokens"] = getattr(usage, 'candidates_token_count', None) or estimate_tokens(text)
+        if key and text:
+            _cache_set(key, text)
+        return text, call
+    except Exception as e:
+        call["error"] = str(e)
+        raise
+    finally:
+        call["latency_s"] = round(time.monotonic() - started, 2)
+        _record(purpose, call)
+
+def generate_stream(contents, model=None, config=None, api_key=None, purpose="default"):
+    """
+    Streaming variant of generate(): yields text deltas as they arrive.
+    Metrics are recorded once the stream ends or is abandoned.
+    """
+    model = model or DEFAULT_MODEL
+    backend = get_backend()
+    backend.check(api_key)
+    started = time.monotonic()
+    call = {"model": model}
+    parts = []
+    try:
+        with _semaphore():
+            for chunk in backend.generate_stream(model, contents, config, api_key):
+                text = getattr(chunk, 'text', None)
+                if text:
+                    parts.append(text)
+                    yield text
+    except Exception as e:
+        call["error"] = str(e)
+        raise
+    finally:
+        call["latency_s"] = round(time.monotonic() - started, 2)
+        call["prompt_tokens"] = estimate_tokens(str(contents))
+        call["output_tokens"] = estimate_tokens("".join(parts))
+        _record(purpose, call)
+
+def get_metrics():
+    """
+    Snapshot of per-purpose call counts, errors, latency and token totals,
+    plus response cache hits, misses and hit rate.
+    """
+    with _METRICS_LOCK:
+        snapshot = {}
+        for purpose, totals in _METRICS.items():
+            lookups = totals["cache_hits"] + totals["cache_misses"]
+            snapshot[purpose] = dict(
+                totals,
+                latency_s=round(totals["latency_s"], 2),
+                cache_hit_rate=round(totals["cache_hits"] / lookups, 3) if lookups else None,
+            )
+        return snapshot
+
+def reset():
+    """Drops cached clients, backends and metrics (settings changes, tests)."""
+    global _SEMAPHORE
+    with _CLIENTS_LOCK:
+        _CLIENTS.clear()
+        _BACKEND_INSTANCES.clear()
+    with _SEMAPHORE_LOCK:
+        _SEMAPHORE = None
+    with _METRICS_LOCK:
+        _METRICS.clear()
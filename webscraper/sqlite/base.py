@@ -0,0 +1,38 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'EXCLUSIVE', 'IMMEDIATE')
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Django's SQLite backend with the two connection OPTIONS that Django 5.1
+    adds, so the settings carry over unchanged on upgrade:
+    'init_command' (";"-separated statements, e.g. PRAGMAs, run on every new
+    connection) and 'transaction_mode' (DEFERRED, IMMEDIATE or EXCLUSIVE,
+    used to BEGIN atomic blocks).
+    """
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        transaction_mode = kwargs.pop('transaction_mode', None)
+        if transaction_mode is not None and transaction_mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"settings.DATABASES transaction_mode must be one of {', '.join(TRANSACTION_MODES)}, "
+                f"not {transaction_mode!r}."
+            )
+        self.transaction_mode = transaction_mode.upper() if transaction_mode else None
+        self.init_commands = kwargs.pop('init_command', '').split(';')
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for command in self.init_commands:
+            if command := command.strip():
+                conn.execute(command)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            self.cursor().execute("BEGIN")
+        else:
+            self.cursor().execute(f"BEGIN {self.transaction_mode}")
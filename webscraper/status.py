@@ -0,0 +1,78 @@
+import asyncio
+import hashlib
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+# Status documents polled by the dashboards (a scrape batch, a research request).
+# Tasks publish() on every state change; views answer polls from the cache only.
+
+def status_key(kind, pk):
+    return f"status:{kind}:{pk}"
+
+def publish(kind, pk, owner_id, payload):
+    """
+    Stores the JSON status of one object with its ETag and owner, for
+    status_response(). Returns the cache entry.
+    """
+    body = json.dumps(payload, cls=DjangoJSONEncoder)
+    entry = {'owner': owner_id, 'body': body, 'etag': f'"{hashlib.md5(body.encode()).hexdigest()}"'}
+    cache.set(status_key(kind, pk), entry, getattr(settings, 'STATUS_CACHE_TTL_S', 300))
+    return entry
+
+def _release_db_connection():
+    # A waiting poll only reads the cache: don't hold a database connection meanwhile
+    if not connection.in_atomic_block:
+        connection.close()
+
+async def status_response(request, kind, pk, build):
+    """
+    Answers a status poll from the cache, for async views (login is checked
+    here). build(pk) publishes the status from the database on a cache miss
+    and returns the entry, or None if the object does not exist. Objects of
+    other users are a 404, as before.
+
+    A request whose If-None-Match matches the current ETag gets a bodiless
+    304. With ?wait=N (capped at STATUS_LONG_POLL_MAX_S) such a request is
+    held instead, re-reading only the cache key, until the status changes or
+    the wait runs out. The wait is an asyncio sleep: served over ASGI it holds
+    no thread, and the database connection is released before waiting.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+
+    async def load():
+        entry = await cache.aget(status_key(kind, pk)) or await sync_to_async(build)(pk)
+        if entry is None or entry['owner'] != user.id:
+            raise Http404("No such status.")
+        return entry
+
+    known = {tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))}
+    try:
+        wait = min(max(float(request.GET.get('wait') or 0), 0), getattr(settings, 'STATUS_LONG_POLL_MAX_S', 25))
+    except ValueError:
+        wait = 0
+    interval = getattr(settings, 'STATUS_LONG_POLL_INTERVAL_S', 1.0)
+
+    entry = await load()
+    deadline = time.monotonic() + wait
+    while entry['etag'] in known and time.monotonic() < deadline:
+        await sync_to_async(_release_db_connection)()
+        await asyncio.sleep(max(0, min(interval, deadline - time.monotonic())))
+        entry = await load()
+
+    if entry['etag'] in known:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(entry['body'], content_type='application/json')
+    response['ETag'] = entry['etag']
+    response['Cache-Control'] = 'private, no-cache'
+    return response
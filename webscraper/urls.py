@@ -41,9 +41,12 @@ urlpatterns = [
 
     # History & Export URLs
     path('history/', core_views.history, name='history'),
+    path('schedules/<int:schedule_id>/toggle/', core_views.toggle_schedule, name='toggle_schedule'),
+    path('schedules/<int:schedule_id>/delete/', core_views.delete_schedule, name='delete_schedule'),
     path('batch/<int:batch_id>/status/', core_views.job_status, name='job_status'),
     path('batch/<int:batch_id>/export/csv/', core_views.export_csv, name='export_csv'),
     path('batch/<int:batch_id>/export/json/', core_views.export_json, name='export_json'),
+    path('products/history/', core_views.price_history, name='price_history'),
     path('research/', include('archive_etl.urls')),
     path('chatbot/',include('chatbot.urls'))
 ]